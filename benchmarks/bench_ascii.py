@@ -0,0 +1,50 @@
+"""Compare the lookup table ascii conversion against the old per-pixel version
+Run from the repo root with: python -m benchmarks.bench_ascii"""
+import sys
+import timeit
+from PIL import Image
+import scripts.string_utils as su
+
+# Image sizes in characters, roughly an avatar, a small terminal and a big one
+SIZES = [(40, 20), (120, 40), (250, 70)]
+REPEATS = 5
+
+def legacy_pixels_to_ascii(image, new_width, ascii_chars=su.ascii_chars):
+    """The conversion as it was before the lookup table, kept here to compare against"""
+    image = image.convert('L')
+    pixels = image.getdata()
+    div = 255/(len(ascii_chars))
+    new_pixels = [ascii_chars[min(round(pixel/div), len(ascii_chars) - 1)] for pixel in pixels]
+    new_pixels = ''.join(new_pixels)
+    new_pixels_count = len(new_pixels)
+    ascii_image = [new_pixels[index:index + new_width] for index in range(0, new_pixels_count, new_width)]
+    ascii_image = "\n".join(ascii_image)
+    return ascii_image
+
+def load_image():
+    """The David Social logo, converted the same way downloaded images are"""
+    return Image.open("assets/david.png").convert("RGBA")
+
+def best_time(function, number):
+    """Best average time per call in seconds"""
+    return min(timeit.repeat(function, number=number, repeat=REPEATS)) / number
+
+def main():
+    source = load_image()
+    print(f"{'size':>10} {'old (ms)':>10} {'new (ms)':>10} {'speedup':>8}")
+    for width, height in SIZES:
+        image = source.resize((width, height))
+
+        # Both have to produce exactly the same art
+        if legacy_pixels_to_ascii(image, width) != su.pixels_to_ascii(image, width):
+            print(f"Output mismatch at {width}x{height}")
+            return 1
+
+        number = max(1, 20000 // (width * height))
+        old = best_time(lambda: legacy_pixels_to_ascii(image, width), number)
+        new = best_time(lambda: su.pixels_to_ascii(image, width), number)
+        print(f"{width:>4}x{height:<5} {old * 1000:>10.3f} {new * 1000:>10.3f} {old / new:>7.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Compare decoding big EXIF rotated photos the old way against the reduced resolution path
+Checks the art still looks the same (exactly the same for images with transparency),
+then times each run in its own process so peak memory can be measured
+Run from the repo root with: python -m benchmarks.bench_decode"""
+import os
+import sys
+import subprocess
+import tempfile
+from io import BytesIO
+from time import perf_counter
+from PIL import Image
+import scripts.string_utils as su
+
+# Phone sized photos with the orientations that need rotating
+FIXTURES = [((4032, 3024), 1), ((4032, 3024), 6), ((4032, 3024), 8), ((3024, 4032), 5)]
+# Roughly what a photo ends up as on a normal terminal
+TARGET = (100, 40)
+REPEATS = 3
+# Images with transparency have to come out exactly as before, at a few widths
+ALPHA_FIXTURES = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "david.png")]
+ALPHA_WIDTHS = [40, 80, 120]
+# Decoding photos at reduced scale rounds a little differently so allow the odd character
+# to be one step along the gradient from what it was
+MAX_CHANGED = 0.05
+
+def legacy_image_to_ascii(image, max_width, max_height):
+    """The decode as it was before, kept here to compare against"""
+    image = image.convert("RGBA")
+    rot = image.getexif().get(274, None)
+    width, height = image.size
+    max_size = (max(width, height), max(width, height))
+    rotated_size = (height, width)
+    rot_dict = {
+        1: lambda x: x,
+        2: lambda x: x.transpose(Image.FLIP_LEFT_RIGHT),
+        3: lambda x: x.rotate(180),
+        4: lambda x: x.rotate(180).transpose(Image.FLIP_LEFT_RIGHT),
+        5: lambda x: x.resize(max_size).rotate(-90).transpose(Image.FLIP_LEFT_RIGHT).resize(rotated_size),
+        6: lambda x: x.resize(max_size).rotate(-90).resize(rotated_size),
+        7: lambda x: x.resize(max_size).rotate(90).transpose(Image.FLIP_LEFT_RIGHT).resize(rotated_size),
+        8: lambda x: x.resize(max_size).rotate(90).resize(rotated_size),
+    }
+    if rot is not None:
+        image = rot_dict[rot](image)
+    width, height = image.size
+    new_width, new_height = su.fit_size(width, height, max_width, max_height)
+    image = image.resize((new_width, new_height))
+    return su.pixels_to_ascii(image, new_width)
+
+PIPELINES = {
+    "old": legacy_image_to_ascii,
+    "new": su.render_ascii,
+}
+
+def compare(old_art, new_art, exact):
+    """Check the new art looks like the old art
+    Returns: what's wrong, None if it's fine"""
+    old_lines, new_lines = old_art.split("\n"), new_art.split("\n")
+    old_shape = (len(old_lines), len(old_lines[0]))
+    new_shape = (len(new_lines), len(new_lines[0]))
+    if old_shape != new_shape:
+        return f"shape {old_shape} vs {new_shape}"
+
+    ramp = "".join(su.ascii_chars)
+    steps = [abs(ramp.index(old) - ramp.index(new)) for old, new in zip(old_art, new_art) if old != "\n"]
+    changed = sum(step > 0 for step in steps)
+    if exact and changed:
+        return f"{changed} of {len(steps)} characters differ"
+    if max(steps) > 1 or changed > MAX_CHANGED * len(steps):
+        return f"{changed} of {len(steps)} characters differ, by up to {max(steps)} steps"
+    return None
+
+def make_fixture(path, size, orientation):
+    """A big JPEG with some detail in it and an orientation tag"""
+    image = Image.radial_gradient("L").resize(size).convert("RGB")
+    exif = Image.Exif()
+    exif[274] = orientation
+    image.save(path, "JPEG", quality=90, exif=exif)
+
+def peak_memory():
+    """Peak resident memory of this process in MB"""
+    # On Linux ru_maxrss carries over the parent's peak, VmHWM doesn't
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_child(pipeline, path):
+    """Time one pipeline on one fixture and report how much extra memory it needed"""
+    with open(path, "rb") as f:
+        content = f.read()
+    convert = PIPELINES[pipeline]
+    before = peak_memory()
+
+    times = []
+    for _ in range(REPEATS):
+        start = perf_counter()
+        convert(Image.open(BytesIO(content)), *TARGET)
+        times.append(perf_counter() - start)
+    print(f"{min(times)} {peak_memory() - before}")
+
+def measure(pipeline, path):
+    """Run a pipeline in a fresh process, returns (seconds, peak MB)"""
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_decode", "--child", pipeline, path],
+                            capture_output=True, text=True, check=True).stdout
+    seconds, memory = output.split()
+    return float(seconds), float(memory)
+
+def main():
+    if "--child" in sys.argv:
+        index = sys.argv.index("--child")
+        run_child(sys.argv[index + 1], sys.argv[index + 2])
+        return 0
+
+    # Transparent images should look exactly the same
+    for path in ALPHA_FIXTURES:
+        for width in ALPHA_WIDTHS:
+            problem = compare(legacy_image_to_ascii(Image.open(path), width, 1000), su.render_ascii(Image.open(path), width, 1000), True)
+            if problem is not None:
+                print(f"Art changed for {path} at width {width}: {problem}")
+                return 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'fixture':>16} {'old (ms)':>10} {'new (ms)':>10} {'old (MB)':>10} {'new (MB)':>10}")
+        for (width, height), orientation in FIXTURES:
+            path = os.path.join(tmp, f"{width}x{height}_{orientation}.jpg")
+            make_fixture(path, (width, height), orientation)
+
+            # The art should look the same both ways
+            problem = compare(legacy_image_to_ascii(Image.open(path), *TARGET), su.render_ascii(Image.open(path), *TARGET), False)
+            if problem is not None:
+                print(f"Art changed for {path}: {problem}")
+                return 1
+
+            old_time, old_memory = measure("old", path)
+            new_time, new_memory = measure("new", path)
+            name = f"{width}x{height} o{orientation}"
+            print(f"{name:>16} {old_time * 1000:>10.1f} {new_time * 1000:>10.1f} {old_memory:>10.1f} {new_memory:>10.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
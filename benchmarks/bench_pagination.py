@@ -0,0 +1,66 @@
+"""Compare how much data scrolling through the bootlicker feed downloads with cursor
+pagination against growing the window, against the stub server
+Run from the repo root with: python -m benchmarks.bench_pagination"""
+import sys
+import scripts.executor as executor
+import scripts.ds_components as components
+from scripts.ds_components import Feed
+from benchmarks.common import use_temp_caches, start_stub, login
+
+# Enough posts that the bootlicker feed goes deeper than we scroll
+NUM_POSTS = 3000
+DEPTHS = [100, 250, 500]
+
+def scroll(session, depth):
+    """Load the feed then keep loading more until we have depth posts"""
+    feed = Feed(session, "Bootlicker")
+    feed.request.result()
+    feed.poll()
+    while len(feed.posts) < depth:
+        if not feed.load_more_posts():
+            break
+        # Merging might start another request if the server ignored the cursor
+        while feed.more_request is not None:
+            feed.more_request.result()
+            feed.poll()
+    return feed
+
+def run(server, session, depth, supports_cursor, use_cursor):
+    """Scroll to depth, returns (posts loaded, requests, bytes)"""
+    handler = server.RequestHandlerClass
+    handler.cursors = supports_cursor
+    components.cursor_support.clear()
+    if not use_cursor:
+        # Pretend we already know the server ignores cursors
+        components.cursor_support["bootlicker-feed"] = False
+
+    handler.requests_served = 0
+    handler.bytes_sent = 0
+    feed = scroll(session, depth)
+    ids = [post.id for post in feed.posts]
+    if len(ids) != len(set(ids)):
+        raise RuntimeError("Duplicate posts in the feed")
+    return len(feed.posts), handler.requests_served, handler.bytes_sent
+
+def main():
+    use_temp_caches()
+    server = start_stub(num_posts=NUM_POSTS)
+    session = login()
+
+    cases = [
+        ("window growth", True, False),
+        ("cursor", True, True),
+        ("cursor, old server", False, True),
+    ]
+    print(f"{'mode':>20} {'depth':>6} {'posts':>6} {'requests':>9} {'KB':>10} {'KB/page':>8}")
+    for depth in DEPTHS:
+        for name, supports_cursor, use_cursor in cases:
+            posts, requests, sent = run(server, session, depth, supports_cursor, use_cursor)
+            print(f"{name:>20} {depth:>6} {posts:>6} {requests:>9} {sent / 1024:>10.1f} {sent / 1024 / requests:>8.1f}")
+
+    server.shutdown()
+    executor.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
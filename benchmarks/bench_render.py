@@ -0,0 +1,121 @@
+"""Time full frame redraws of each state on a virtual screen against the stub server,
+and check what each state draws against the saved snapshots in benchmarks/snapshots
+Run from the repo root with: python -m benchmarks.bench_render
+Add --update-snapshots to save what's drawn now as the new snapshots"""
+import os
+import sys
+import random
+import difflib
+import logging
+import timeit
+from time import monotonic, sleep
+import scripts.executor as executor
+import scripts.states as states
+from scripts.ds_components import Ticker
+from scripts.render import Renderer
+from scripts.virtual_screen import headless
+from benchmarks.common import use_temp_caches, start_stub, login
+
+# Terminal sizes to draw at (rows, columns)
+SIZES = [(30, 100), (50, 200)]
+FRAMES = 50
+REPEATS = 5
+# How long to wait for a state's requests and images before giving up
+SETTLE_TIMEOUT = 30
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), "snapshots")
+
+def make_states(stdscr, session, logger):
+    """Every state that draws without waiting on the keyboard, by name
+    Text entry reads keys inside draw and exit quits during update so they're left out"""
+    return {
+        "main": lambda: states.StateMain(stdscr, session, logger),
+        "bootlicker_feed": lambda: states.StateFeed(stdscr, session, logger, "Bootlicker"),
+        "global_feed": lambda: states.StateFeed(stdscr, session, logger, "Global"),
+        "notifications": lambda: states.StateNotifications(stdscr, session, logger),
+        "profile": lambda: states.StateProfile(stdscr, session, logger, "David"),
+        "pet_cat": lambda: states.StatePetCat(stdscr, session, logger),
+        "text_viewer": lambda: states.StateTextViewer(stdscr, session, logger, "Some text to look at\n" * 5),
+    }
+
+def is_settled(state):
+    """Nothing is loading and nothing is waiting to be picked up"""
+    if executor.pending() > 0:
+        return False
+    for component in state.get_components():
+        if component is not None and hasattr(component, "is_loading") and component.is_loading():
+            return False
+    return True
+
+def settle(state, renderer):
+    """Update and draw until everything the state asked for has arrived"""
+    deadline = monotonic() + SETTLE_TIMEOUT
+    # A couple of settled frames in a row, drawing can start more work (e.g. the main menu logo)
+    settled = 0
+    while settled < 3 and monotonic() < deadline:
+        state.update()
+        renderer.render(state, full=True)
+        settled = settled + 1 if is_settled(state) else 0
+        sleep(0.01)
+
+    # Stop the ticker so the snapshot doesn't depend on when it was taken
+    for component in state.get_components():
+        if isinstance(component, Ticker):
+            component.start = monotonic()
+            component.update()
+    renderer.render(state, full=True)
+
+def check_snapshot(name, snapshot, update):
+    """Compare against the saved snapshot
+    Returns: a status to print and whether it matched"""
+    path = os.path.join(SNAPSHOT_DIR, f"{name}.txt")
+    if update or not os.path.exists(path):
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            f.write(snapshot + "\n")
+        return "saved", True
+
+    with open(path) as f:
+        expected = f.read().rstrip("\n")
+    if expected == snapshot:
+        return "ok", True
+
+    diff = difflib.unified_diff(expected.splitlines(), snapshot.splitlines(), "expected", "drawn", lineterm="")
+    print("\n".join(diff))
+    return "CHANGED", False
+
+def main():
+    update = "--update-snapshots" in sys.argv
+    use_temp_caches()
+    server = start_stub()
+    logger = logging.getLogger()
+    all_matched = True
+
+    print(f"{'state':>16} {'size':>8} {'ms/frame':>9} {'cells/frame':>12} {'snapshot':>9}")
+    for height, width in SIZES:
+        with headless(height, width) as screen:
+            session = login()
+            renderer = Renderer(screen.stdscr)
+            for name, make_state in make_states(screen.stdscr, session, logger).items():
+                # Anything random (the cat's face) comes out the same every run
+                random.seed(0)
+                state = make_state()
+                settle(state, renderer)
+                status, matched = check_snapshot(f"{name}_{height}x{width}", screen.snapshot(), update)
+                all_matched = all_matched and matched
+
+                cells = screen.cells_written
+                best = min(timeit.repeat(lambda: renderer.render(state, full=True), number=FRAMES, repeat=REPEATS)) / FRAMES
+                # Redrawing the same frame shouldn't change anything on the terminal
+                cells = (screen.cells_written - cells) / (FRAMES * REPEATS)
+                print(f"{name:>16} {f'{height}x{width}':>8} {best * 1000:>9.3f} {cells:>12.1f} {status:>9}")
+
+                state.cleanup()
+                screen.stdscr.erase()
+
+    server.shutdown()
+    executor.shutdown()
+    return 0 if all_matched else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+"""Setup shared by the benchmarks"""
+import atexit
+import shutil
+import tempfile
+import scripts.api_routes as david_api
+import scripts.disk_cache as disk_cache
+import scripts.image_cache as image_cache
+import scripts.secrets as secrets
+import scripts.stub_server as stub_server
+
+# Who the benchmarks log in to the stub server as
+USERNAME = "eatkin"
+
+def use_temp_caches():
+    """Keep benchmark data out of the real caches in ~/.david_cache
+    Call before anything touches the caches, the directory is removed on exit"""
+    directory = tempfile.mkdtemp(prefix="david-bench-")
+    atexit.register(shutil.rmtree, directory, True)
+    disk_cache.db_path = f"{directory}/david.db"
+    image_cache.cache_dir = f"{directory}/images"
+    image_cache.index_path = f"{image_cache.cache_dir}/index.json"
+    return directory
+
+def start_stub(**settings):
+    """Start the stub server and point the client at it, returns the server"""
+    server, base_url = stub_server.serve(**settings)
+    david_api.set_base_url(base_url)
+    # States look up who's logged in from the saved credentials, which aren't the stub user
+    secrets.get_username = lambda: USERNAME
+    return server
+
+def login():
+    """Log in to the stub server, returns the session"""
+    return david_api.query_api("login", [USERNAME, "benchmark"])
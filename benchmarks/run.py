@@ -0,0 +1,256 @@
+"""Benchmark suite for the client's hot paths
+Times ascii conversion, menu and ticker drawing, feed merges, drawing a post and
+importing david.py, saves the results as JSON and flags anything slower than the baseline
+Everything runs on a virtual screen against the stub server, nothing leaves the machine
+Run from the repo root with: python -m benchmarks.run
+    --save-baseline     save these results as the baseline to compare future runs against
+    --baseline PATH     compare against a different baseline (default benchmarks/baseline.json)
+    --output PATH       where to save the results (default benchmarks/results/<time>.json)
+    --threshold 0.25    how much slower counts as a regression
+    --filter TEXT       only run benchmarks with TEXT in their name"""
+import os
+import sys
+import json
+import logging
+import argparse
+import platform
+import subprocess
+import timeit
+from datetime import datetime
+from time import monotonic, sleep
+from PIL import Image
+import scripts.executor as executor
+import scripts.string_utils as su
+import scripts.states as states
+from scripts.ds_components import Menu, Ticker, Feed
+from scripts.render import Renderer
+from scripts.virtual_screen import headless
+from benchmarks.common import use_temp_caches, start_stub, login
+from benchmarks.bench_render import settle
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+REPEATS = 5
+ASCII_SIZES = [(40, 20), (120, 40), (250, 70)]
+# Posts in the feed before merging and how many arrive in a page
+FEED_SIZE = 500
+PAGE_SIZE = 50
+IMPORT_RUNS = 5
+
+def best_time(function, number, setup=None):
+    """Best average time per call in seconds, setup runs before each batch and isn't timed"""
+    return min(timeit.repeat(function, setup=setup or (lambda: None), number=number, repeat=REPEATS)) / number
+
+def wait_for_workers():
+    """Let background jobs a benchmark started finish so they don't slow down the next one"""
+    while executor.pending() > 0:
+        sleep(0.01)
+    executor.drain_wakeups()
+
+def make_posts(start, count):
+    """Posts newest first with ids counting down from start, the odd one a David selection"""
+    return [{
+        "id": i,
+        "username": f"user{i % 13}",
+        "content": f"Post number {i} " + "words " * 20,
+        "likes": i % 5,
+        "avi": "",
+        "attached_image": "",
+        "userid": None,
+        "timestamp": "2024-01-16T04:57:01.998Z",
+        "reply_to": None,
+        "liked_by": [f"user{j}" for j in range(i % 4)],
+        "ncomments": 0,
+        "david_selection": i % 37 == 0,
+    } for i in range(start, start - count, -1)]
+
+def bench_ascii(directory):
+    """Converting a photo to ascii at a few terminal sizes"""
+    path = os.path.join(directory, "photo.jpg")
+    Image.radial_gradient("L").resize((1600, 1200)).convert("RGB").save(path, "JPEG", quality=90)
+    results = {}
+    for width, height in ASCII_SIZES:
+        results[f"image_to_ascii/{width}x{height}"] = best_time(lambda: su.image_to_ascii(path, url=False, size=(width, height)), 5)
+    return results
+
+def bench_menu(stdscr):
+    """Drawing the main menu, with and without working out the layout again"""
+    items = ["Bootlicker Feed", "Global Feed", "View Notifications", "New Post", "Pet the Cat", "Update Ticker", "View Profile", "Exit"]
+    menu = Menu(stdscr, items, [None] * len(items))
+    menu.draw()
+
+    def relayout():
+        menu.layout = None
+        menu.draw()
+
+    return {
+        "menu_draw": best_time(menu.draw, 1000),
+        "menu_draw/relayout": best_time(relayout, 1000),
+    }
+
+def bench_ticker(stdscr):
+    """Ticker updates, most don't move it and some scroll it along"""
+    ticker = Ticker(stdscr, "The ticker text goes round and round " * 3)
+    ticker.update()
+
+    def scroll():
+        ticker.position = None
+        ticker.update()
+
+    return {
+        "ticker_update/idle": best_time(ticker.update, 10000),
+        "ticker_update/scroll": best_time(scroll, 1000),
+    }
+
+def bench_feed(session):
+    """Merging pages of posts into a feed"""
+    feed = Feed(session, "Global")
+    feed.request.result()
+    feed.poll()
+    initial = make_posts(100000, FEED_SIZE)
+    older = make_posts(100000 - FEED_SIZE, PAGE_SIZE)
+    # Half new and half already in the feed, like a refresh
+    newer = make_posts(100000 + PAGE_SIZE // 2, PAGE_SIZE)
+
+    def reset():
+        feed.set_posts_list([feed.make_post(post) for post in initial])
+
+    results = {
+        "feed_set_posts": best_time(lambda: feed.set_posts(initial), 1),
+        "feed_merge_more": best_time(lambda: feed.merge_more_posts(older), 1, reset),
+        "feed_merge_new": best_time(lambda: feed.merge_new_posts(newer, True), 1, reset),
+    }
+    # Wait for anything the feed saved to disk before moving on
+    wait_for_workers()
+    return results
+
+def bench_draw_post(screen, session, logger):
+    """Drawing a post in the feed viewer"""
+    state = states.StateFeed(screen.stdscr, session, logger, "Bootlicker")
+    settle(state, Renderer(screen.stdscr))
+
+    def draw():
+        screen.stdscr.erase()
+        state.draw_post()
+
+    result = {"state_feed_draw_post": best_time(draw, 200)}
+    state.cleanup()
+    return result
+
+def bench_main_menu(screen, session, logger):
+    """Everything that happens before the main menu can be shown"""
+    renderer = Renderer(screen.stdscr)
+
+    def first_frame():
+        state = states.StateMain(screen.stdscr, session, logger)
+        renderer.render(state, full=True)
+        state.cleanup()
+
+    result = {"main_menu_first_frame": best_time(first_frame, 5)}
+    # Let the requests it started finish
+    wait_for_workers()
+    return result
+
+def bench_import():
+    """Importing david.py in a fresh interpreter, as cold as it gets with bytecode already compiled"""
+    code = "from time import perf_counter; t = perf_counter(); import david; print(perf_counter() - t)"
+    times = []
+    for _ in range(IMPORT_RUNS):
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+        times.append(float(output.stdout.strip().splitlines()[-1]))
+    return {"import_david": min(times)}
+
+def run_all(name_filter=None):
+    """Run every benchmark, returns {name: seconds}"""
+    directory = use_temp_caches()
+    server = start_stub(num_posts=500)
+    logger = logging.getLogger()
+    results = {}
+
+    def wanted(group):
+        return name_filter is None or name_filter in group or group in name_filter
+
+    if wanted("image_to_ascii"):
+        results.update(bench_ascii(directory))
+    with headless(40, 150) as screen:
+        session = login()
+        if wanted("menu_draw"):
+            results.update(bench_menu(screen.stdscr))
+        if wanted("ticker_update"):
+            results.update(bench_ticker(screen.stdscr))
+        if wanted("feed"):
+            results.update(bench_feed(session))
+        if wanted("state_feed_draw_post"):
+            results.update(bench_draw_post(screen, session, logger))
+        if wanted("main_menu_first_frame"):
+            results.update(bench_main_menu(screen, session, logger))
+    if wanted("import_david"):
+        results.update(bench_import())
+
+    server.shutdown()
+    # Narrower filters than a whole group
+    return {name: seconds for name, seconds in results.items() if name_filter is None or name_filter in name}
+
+def compare(results, baseline, threshold):
+    """Print the results next to the baseline
+    Returns: names of the benchmarks that got slower by more than the threshold"""
+    regressions = []
+    print(f"{'benchmark':>28} {'baseline (ms)':>14} {'now (ms)':>10} {'change':>8}")
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:>28} {'-':>14} {seconds * 1000:>10.3f} {'new':>8}")
+            continue
+        change = seconds / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:>28} {before * 1000:>14.3f} {seconds * 1000:>10.3f} {change:>+7.0%}{flag}")
+    return regressions
+
+def save(path, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, f, indent=2)
+    print(f"Saved results to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the client's hot paths")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--filter", default=None)
+    args = parser.parse_args()
+
+    start = monotonic()
+    results = run_all(args.filter)
+    executor.shutdown()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    print(f"Ran {len(results)} benchmarks in {monotonic() - start:.1f}s")
+
+    save(args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"), results)
+    if args.save_baseline:
+        save(args.baseline, results)
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
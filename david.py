@@ -7,24 +7,63 @@ import atexit
 import curses
 from curses import wrapper
 from datetime import datetime
-from time import sleep
+from time import sleep, perf_counter
 import scripts.secrets as secrets
 import scripts.config as config
 import scripts.api_routes as david_api
+import scripts.executor as executor
+import scripts.image_cache as image_cache
+import scripts.disk_cache as disk_cache
+import scripts.profiler as profiler
+import scripts.tracer as tracer
+import scripts.api_metrics as api_metrics
+import scripts.ascii_cache as ascii_cache
+import scripts.store as store
+import scripts.states as states
 from scripts.states import StateMain
+from scripts.scheduler import Scheduler
+from scripts.render import Renderer
 import scripts.config as config
 import scripts.file_utils as utils
 
-# Initialise curses
-stdscr = curses.initscr()
-curses.noecho()
-curses.cbreak()
-curses.start_color()
+# Curses and logging are only set up when we're actually run, so importing this is cheap
+stdscr = None
+LOGFILE, LOGGER = None, None
+
+def curses_init():
+    """Initialise curses"""
+    global stdscr
+    stdscr = curses.initscr()
+    curses.noecho()
+    curses.cbreak()
+    curses.start_color()
 
 # Get log clearing setting
 config_dict = config.read_config()
 clear_logs = config_dict['clear_logs']
 
+def get_arg(name):
+    """Get the value of a command line option given as --name value or --name=value, None if it's not there"""
+    for i, arg in enumerate(sys.argv):
+        if arg == name and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+        if arg.startswith(name + "="):
+            return arg.split("=", 1)[1]
+    return None
+
+def trace_init():
+    """Start recording a trace if asked to with --trace"""
+    if "--trace" in sys.argv:
+        tracer.start()
+
+def profile_init():
+    """Start profiling if asked to with --profile, --profile=cpu, --profile=memory or --profile=cpu,memory"""
+    for arg in sys.argv:
+        if arg == "--profile" or arg.startswith("--profile="):
+            modes = arg.partition("=")[2].split(",")
+            profiler.start(cpu="cpu" in modes, memory="memory" in modes)
+            return
+
 # Set up logging
 def logging_init():
     """Createss a logfile with the current date and time"""
@@ -40,12 +79,38 @@ def logging_init():
     logger = logging.getLogger()
     return filename, logger
 
-LOGFILE, LOGGER = logging_init()
-
 def cleanup():
     """Cleanup curses and remove logfile if empty or if logs should be cleared"""
     curses.endwin()
 
+    # Stop background requests and close pooled connections
+    executor.shutdown()
+    david_api.client.close()
+    # Remember which cached images were used
+    image_cache.save()
+    disk_cache.close()
+
+    # Write what each API route cost next to the log, unless we're not keeping logs
+    if not clear_logs:
+        path = api_metrics.write_summary(os.path.splitext(LOGFILE)[0] + "_api.txt")
+        if path is not None:
+            print(f"API stats written to {path}")
+
+    # Write the profile next to the log
+    if profiler.enabled():
+        path = profiler.write_summary(os.path.splitext(LOGFILE)[0] + "_profile.txt", {
+            "ascii cache": f"{len(ascii_cache.cache.entries)} images, {ascii_cache.cache.size} characters",
+            # Keys are FeedTypes for the main feeds, usernames for user feeds and post ids for replies
+            "feeds cached": ", ".join(f"{getattr(key, 'name', key)} ({len(feed.posts)} posts)" for key, feed in states.feeds.items()) or "none",
+            "store": store.stats(),
+        })
+        print(f"Profile written to {path}")
+
+    # Write the trace next to the log
+    if tracer.enabled():
+        path = tracer.write(os.path.splitext(LOGFILE)[0] + "_trace.json")
+        print(f"Trace written to {path}, open it in https://ui.perfetto.dev")
+
     # Check if the logfile is empty or if logs should be cleared
     if os.stat(LOGFILE).st_size == 0 or clear_logs:
         # If it is, delete it
@@ -57,8 +122,6 @@ def cleanup():
     except:
         pass
 
-atexit.register(cleanup)
-
 def get_credentials(overwrite=False):
     curses.echo()
     stdscr.clear()
@@ -183,36 +246,62 @@ def main(stdscr):
     # Instantiate the state
     state = StateMain(stdscr, session, LOGGER)
 
+    # Scheduler sleeps until there's something to do and caps the frame rate
+    scheduler = Scheduler(stdscr, refresh_rate)
+    # Renderer only writes what has changed to the terminal
+    renderer = Renderer(stdscr)
+
     """Main loop"""
     while True:
+        # Wait for input, an animation deadline or finished background work
+        start = perf_counter()
+        scheduler.wait(state)
+        tracer.complete("wait", "frame", start, perf_counter())
+
         # Update the state
         # If it returns a state then we need to change state
         # Otherwise it will return None and we continue normal execution
+        # A state change counts towards the new state since building it is most of the work
+        start = perf_counter()
         try:
             new_state = state.update()
+            scheduler.handle_input(state)
             if new_state is not None:
                 state = new_state
                 logging.info(f"Changed state to {state}")
                 stdscr.clear()
+                scheduler.mark_dirty()
         except Exception as e:
             logging.exception(e)
 
-        # Draw the state
-        # Curses always fails when drawing, so we need to catch the exception
-        stdscr.move(0, 0)
-        try:
-            state.draw()
-        except Exception as e:
-            # Only enable this if you REALLY NEED TO DEBUG
-            # Because otherwise it will print a billion errors if you try resize the window
-            # logging.exception(e)
-            pass
-
-        stdscr.refresh()
-        curses.doupdate()
-
-        # Sleep interval seems to prevent flickering
-        # sleep(refresh_rate)
-
-
-wrapper(main)
+        end = perf_counter()
+        update_time = end - start
+        tracer.complete("update", "frame", start, end, {"state": type(state).__name__})
+
+        # Only draw if something has changed
+        if not scheduler.frame_due(state):
+            profiler.record(state, update_time)
+            continue
+
+        # Redraw the whole state if it has changed, otherwise just the components that have
+        start = perf_counter()
+        full = scheduler.dirty
+        renderer.render(state, full=full)
+        scheduler.frame_drawn()
+        end = perf_counter()
+        profiler.record(state, update_time, end - start)
+        tracer.complete("draw", "frame", start, end, {"state": type(state).__name__, "full": full})
+
+
+if __name__ == "__main__":
+    # Use a different server (like the stub server) if we're asked to
+    base_url = get_arg("--base-url")
+    if base_url is not None:
+        david_api.set_base_url(base_url)
+
+    LOGFILE, LOGGER = logging_init()
+    profile_init()
+    trace_init()
+    curses_init()
+    atexit.register(cleanup)
+    wrapper(main)
@@ -0,0 +1,77 @@
+import logging
+from time import sleep
+import requests
+from requests.adapters import HTTPAdapter
+
+# Default timeouts as (connect, read) in seconds
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Status codes worth retrying, anything else we hand straight back
+RETRY_STATUSES = (502, 503, 504)
+
+class RoutePolicy():
+    """Timeout and retry policy for a route"""
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=0, backoff=0.25):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+# GET requests are safe to retry, POST requests are not (we don't want to post things twice)
+GET_POLICY = RoutePolicy(retries=2)
+POST_POLICY = RoutePolicy(retries=0)
+
+class ApiClient():
+    """Long-lived HTTP client shared by everything that talks to David Social
+    Connections are pooled and kept alive so we only pay for the TCP+TLS handshake once"""
+    def __init__(self, base_url, pool_size=10):
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Per-route overrides, anything not in here uses the method default
+        self.policies = {}
+
+    def set_policy(self, route, policy):
+        """Set the timeout and retry policy for a route"""
+        self.policies[route] = policy
+
+    def get_policy(self, route, method):
+        """Get the policy for a route, falling back to the default for its method"""
+        if route in self.policies:
+            return self.policies[route]
+        return GET_POLICY if method == "GET" else POST_POLICY
+
+    def request(self, route, method, path, **kwargs):
+        """Make a request to the API using the route's policy"""
+        return self.send(method, self.base_url + path, self.get_policy(route, method), **kwargs)
+
+    def fetch(self, url, policy=GET_POLICY, **kwargs):
+        """GET an absolute url (e.g. images) over the shared session"""
+        return self.send("GET", url, policy, **kwargs)
+
+    def send(self, method, url, policy, **kwargs):
+        """Send a request, retrying connection failures and gateway errors"""
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, timeout=policy.timeout, **kwargs)
+                # The session is only here to pool connections, cookies are passed with each request
+                # Without this the login cookie would stick to the session and calls made without
+                # cookies would be logged in too
+                self.session.cookies.clear()
+                if response.status_code not in RETRY_STATUSES or attempt >= policy.retries:
+                    return response
+                logging.warning(f"{method} {url} returned {response.status_code}, retrying")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= policy.retries:
+                    raise
+                logging.warning(f"{method} {url} failed ({e}), retrying")
+
+            attempt += 1
+            # Exponential backoff between attempts
+            sleep(policy.backoff * 2 ** (attempt - 1))
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
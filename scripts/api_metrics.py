@@ -0,0 +1,105 @@
+import threading
+from collections import Counter, deque
+
+# Per-route numbers for every call through query_api: how many, how big, what came back and how long it took
+# Shown on the stats screen and written to the log directory at exit
+
+# Latencies kept per route for the percentiles, the most recent ones are the interesting ones anyway
+LATENCY_SAMPLES = 1000
+
+# query_api runs on worker threads
+_lock = threading.Lock()
+_routes = {}
+
+class RouteMetrics():
+    """Everything we know about the calls to one route"""
+    def __init__(self):
+        self.calls = 0
+        # Calls answered from the response cache or by sharing someone else's request, not counted in calls
+        self.cached = 0
+        self.shared = 0
+        # Requests that never got a response (timeouts, connection errors)
+        self.failures = 0
+        self.bytes = 0
+        self.total_time = 0.0
+        self.statuses = Counter()
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def percentile(self, p):
+        """Latency percentile in seconds, nearest rank"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+def get_route(route):
+    metrics = _routes.get(route)
+    if metrics is None:
+        metrics = _routes[route] = RouteMetrics()
+    return metrics
+
+def record(route, status, size, latency):
+    """Record a call, status is None if there was no response"""
+    with _lock:
+        metrics = get_route(route)
+        metrics.calls += 1
+        metrics.total_time += latency
+        metrics.latencies.append(latency)
+        if status is None:
+            metrics.failures += 1
+        else:
+            metrics.statuses[status] += 1
+            metrics.bytes += size
+
+def record_hit(route):
+    """Record a call that came out of the response cache"""
+    with _lock:
+        get_route(route).cached += 1
+
+def record_shared(route):
+    """Record a call that got the result of an identical request instead of making its own"""
+    with _lock:
+        get_route(route).shared += 1
+
+def rows():
+    """A row per route, busiest first
+    Returns: list of dicts with route, calls, cached, shared, failures, bytes, statuses, p50, p95, p99 (seconds)"""
+    with _lock:
+        return sorted(({
+            "route": route,
+            "calls": metrics.calls,
+            "cached": metrics.cached,
+            "shared": metrics.shared,
+            "failures": metrics.failures,
+            "bytes": metrics.bytes,
+            "statuses": dict(metrics.statuses),
+            "p50": metrics.percentile(50),
+            "p95": metrics.percentile(95),
+            "p99": metrics.percentile(99),
+        } for route, metrics in _routes.items()), key=lambda row: -(row["calls"] + row["cached"] + row["shared"]))
+
+def table():
+    """The metrics as lines of text"""
+    lines = [f"{'route':<24}{'calls':>6}{'cached':>7}{'shared':>7}{'fail':>5}{'KB':>9}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}  statuses"]
+    all_rows = rows()
+    for row in all_rows:
+        statuses = " ".join(f"{status}x{count}" for status, count in sorted(row["statuses"].items()))
+        lines.append(f"{row['route']:<24}{row['calls']:>6}{row['cached']:>7}{row['shared']:>7}{row['failures']:>5}{row['bytes'] / 1024:>9.1f}"
+                     f"{row['p50'] * 1000:>8.0f}{row['p95'] * 1000:>8.0f}{row['p99'] * 1000:>8.0f}  {statuses}")
+    if all_rows:
+        saved = sum(row["cached"] + row["shared"] for row in all_rows)
+        lines += ["", f"{saved} calls saved by the cache and sharing requests"]
+    return lines
+
+def write_summary(path):
+    """Write the table to a file, nothing is written if no calls were made"""
+    if not _routes:
+        return None
+    with open(path, "w") as f:
+        f.write("\n".join(table()) + "\n")
+    return path
+
+def reset():
+    """Forget everything"""
+    with _lock:
+        _routes.clear()
@@ -1,33 +1,42 @@
-import requests
+import os
 import json
+from time import perf_counter
 from bs4 import BeautifulSoup
+from scripts.api_client import ApiClient, RoutePolicy
+import scripts.executor as executor
+import scripts.api_metrics as api_metrics
+import scripts.tracer as tracer
+import scripts.response_cache as response_cache
+import scripts.single_flight as single_flight
 
-BASE_URL = "https://david-production.up.railway.app"
+DEFAULT_BASE_URL = "https://david-production.up.railway.app"
+# Point somewhere else (like the stub server) with DAVID_BASE_URL or --base-url
+BASE_URL = os.environ.get("DAVID_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
 
 # Define routes for the API
 routes = {
-    'ping': (requests.get, '/api/ping'),
-    'version': (requests.get, '/api/version'),
-    'avi-url': (requests.get, '/api/avi-url'),
-    'user-posts': (requests.get, '/api/user-posts'),
-    'replies': (requests.get, '/api/replies'),
-    'get-post': (requests.get, '/api/get-post'),
-    'user-list': (requests.get, '/api/user-list'),
-    'bootlickers': (requests.get, '/api/bootlickers'),
-    'bootlicking': (requests.get, '/api/bootlicking'),
-    'liked-by': (requests.get, '/api/liked-by'),
-    'profile': (requests.get, '/api/profile'),
-    'get-ticker-text': (requests.get, '/api/get-ticker-text'),
-    'login': (requests.post, '/api/login'),
-    'global-feed': (requests.post, '/api/global-feed'),
-    'bootlicker-feed': (requests.post, '/api/bootlicker-feed'),
-    'new-post': (requests.post, '/api/new-post'),
-    'delete-post': (requests.post, '/api/delete-post'),
-    'like-post': (requests.post, '/api/like-post'),
-    'my-notifications': (requests.post, '/api/my-notifications'),
-    'public-set-ticker-text': (requests.post, '/api/public-set-ticker-text'),
-    'pet-cat': (requests.get, '/api/pet-cat'),
-    'get-cat-pets': (requests.get, '/api/get-cat-pets'),
+    'ping': ('GET', '/api/ping'),
+    'version': ('GET', '/api/version'),
+    'avi-url': ('GET', '/api/avi-url'),
+    'user-posts': ('GET', '/api/user-posts'),
+    'replies': ('GET', '/api/replies'),
+    'get-post': ('GET', '/api/get-post'),
+    'user-list': ('GET', '/api/user-list'),
+    'bootlickers': ('GET', '/api/bootlickers'),
+    'bootlicking': ('GET', '/api/bootlicking'),
+    'liked-by': ('GET', '/api/liked-by'),
+    'profile': ('GET', '/api/profile'),
+    'get-ticker-text': ('GET', '/api/get-ticker-text'),
+    'login': ('POST', '/api/login'),
+    'global-feed': ('POST', '/api/global-feed'),
+    'bootlicker-feed': ('POST', '/api/bootlicker-feed'),
+    'new-post': ('POST', '/api/new-post'),
+    'delete-post': ('POST', '/api/delete-post'),
+    'like-post': ('POST', '/api/like-post'),
+    'my-notifications': ('POST', '/api/my-notifications'),
+    'public-set-ticker-text': ('POST', '/api/public-set-ticker-text'),
+    'pet-cat': ('GET', '/api/pet-cat'),
+    'get-cat-pets': ('GET', '/api/get-cat-pets'),
 }
 
 # Lookup table for the parameters of each route
@@ -45,8 +54,9 @@ route_params = {
     'profile': ['username'],
     'get-ticker-text': [],
     'login': ['username', 'password'],
-    'global-feed': ['window'],
-    'bootlicker-feed': ['window'],
+    # Feeds take an optional cursor (the id of the oldest post we have) to only get older posts
+    'global-feed': ['window', 'before'],
+    'bootlicker-feed': ['window', 'before'],
     'new-post': ['text', 'replyTo'],
     'delete-post': ['id'],
     'like-post': ['id'],
@@ -56,18 +66,76 @@ route_params = {
     'get-cat-pets': [],
 }
 
+# One client for the whole app so every request shares the same connection pool
+client = ApiClient(BASE_URL)
+
+def set_base_url(base_url):
+    """Send requests somewhere other than BASE_URL"""
+    global BASE_URL
+    BASE_URL = base_url.rstrip("/")
+    client.base_url = BASE_URL
+
+# Routes that need something other than the default policy for their method
+# Ping should fail fast, feeds can be big so give them longer to arrive
+# Login, the feeds and notifications are POSTs but they only read (logging in again just gets
+# another session) so they're safe to try again, unlike the POSTs that change things
+client.set_policy('ping', RoutePolicy(timeout=(3.05, 5), retries=1))
+client.set_policy('login', RoutePolicy(timeout=(3.05, 15), retries=1))
+client.set_policy('global-feed', RoutePolicy(timeout=(3.05, 20), retries=1))
+client.set_policy('bootlicker-feed', RoutePolicy(timeout=(3.05, 20), retries=1))
+client.set_policy('my-notifications', RoutePolicy(timeout=(3.05, 15), retries=1))
+# Petting the cat is a GET but it isn't safe to repeat
+client.set_policy('pet-cat', RoutePolicy(retries=0))
+
 def query_api(route, params=[], cookies=None, verbose=False):
     if route not in routes:
         return None
 
     params = {p_name: p for p_name, p in zip(route_params[route], params)}
 
-    # Construct url
-    url = BASE_URL + routes[route][1]
+    # Writes always go to the server
+    if not single_flight.shareable(route):
+        return send_request(route, params, cookies)
 
+    # Reference data we asked for recently comes out of the cache
+    key = response_cache.make_key(route, params, cookies)
+    if response_cache.cacheable(route):
+        data = response_cache.get(key)
+        if data is not None:
+            api_metrics.record_hit(route)
+            tracer.instant(route, "api cache")
+            return data
 
-    # Make the request
-    response = routes[route][0](url, json=params, params=params, cookies=cookies)
+    # Otherwise share the request with anyone else asking for the same thing right now
+    data, shared = single_flight.run(key, lambda: send_request(route, params, cookies, key))
+    if shared:
+        api_metrics.record_shared(route)
+        tracer.instant(route, "api shared")
+    return data
+
+def send_request(route, params, cookies, key=None):
+    """Make the request and get the data out of the response, key is for the response cache"""
+    method, path = routes[route]
+    cacheable = key is not None and response_cache.cacheable(route)
+    if cacheable:
+        generation = response_cache.generation(route)
+
+    # Make the request over the shared session, keeping count of what each route costs
+    start = perf_counter()
+    try:
+        response = client.request(route, method, path, json=params, params=params, cookies=cookies)
+    except Exception as e:
+        # A write might have got through even if we didn't hear back
+        invalidate(route)
+        end = perf_counter()
+        api_metrics.record(route, None, 0, end - start)
+        tracer.complete(route, "api", start, end, {"error": type(e).__name__})
+        raise
+    end = perf_counter()
+    api_metrics.record(route, response.status_code, len(response.content), end - start)
+    tracer.complete(route, "api", start, end, {"status": response.status_code, "bytes": len(response.content)})
+    # Anything cached that this changed is out of date now
+    invalidate(route)
 
     if response.status_code == 200:
         # Specific exception for login
@@ -75,23 +143,42 @@ def query_api(route, params=[], cookies=None, verbose=False):
             # This returns the session
             return response
 
-        # Some of the get requests return a string instead of json
-        try:
-            json_data = response.json()
-        except:
-            html = response.text
-            soup = BeautifulSoup(html, "html.parser")
-            # Extract the text from the soup
-            json_data = soup.text
-
-        # Check if there IS data
-        if json_data == "" or json_data is None:
-            return None
-
-        # Finally parse the json if applicable
-        try:
-            return json.loads(json_data)
-        except:
-            return json_data
+        with tracer.span("parse " + route, "api"):
+            data = parse_response(response)
+        if cacheable:
+            response_cache.put(key, data, generation)
+        return data
     else:
         return None
+
+def invalidate(route):
+    """Forget anything we've kept that a write to a route makes out of date"""
+    if single_flight.shareable(route):
+        return
+    response_cache.invalidate(route)
+    single_flight.wrote()
+
+def parse_response(response):
+    """Get the data out of a successful response, json where there is some"""
+    # Some of the get requests return a string instead of json
+    try:
+        json_data = response.json()
+    except:
+        html = response.text
+        soup = BeautifulSoup(html, "html.parser")
+        # Extract the text from the soup
+        json_data = soup.text
+
+    # Check if there IS data
+    if json_data == "" or json_data is None:
+        return None
+
+    # Finally parse the json if applicable
+    try:
+        return json.loads(json_data)
+    except:
+        return json_data
+
+def query_api_async(route, params=[], cookies=None):
+    """Run query_api on a background worker, returns a future of the result"""
+    return executor.submit(query_api, route, params, cookies)
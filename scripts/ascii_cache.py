@@ -0,0 +1,44 @@
+from collections import OrderedDict
+
+# Rendered ascii art kept in memory so flicking between posts or resizing the terminal
+# back to a size we've seen before doesn't have to decode and convert the image again
+# Capped by the total number of characters stored (roughly bytes for ascii)
+MAX_SIZE = 4 * 1024 * 1024
+
+class AsciiCache():
+    """Least recently used cache of rendered ascii art"""
+    def __init__(self, max_size=MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        """Get the ascii for a key, None if we don't have it"""
+        ascii = self.entries.get(key)
+        if ascii is not None:
+            self.entries.move_to_end(key)
+        return ascii
+
+    def put(self, key, ascii):
+        """Store the ascii for a key, evicting the least recently used art if we're over the cap"""
+        if ascii is None or len(ascii) > self.max_size:
+            return
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        self.entries[key] = ascii
+        self.size += len(ascii)
+        while self.size > self.max_size:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        """Forget everything"""
+        self.entries.clear()
+        self.size = 0
+
+# Shared by every AsciiImage
+cache = AsciiCache()
+
+def make_key(source, width, height, charset, dim_adjust):
+    """Everything that decides what the rendered art looks like"""
+    return (source, width, height, charset, tuple(dim_adjust))
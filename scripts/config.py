@@ -5,18 +5,26 @@ import scripts.file_utils as fu
 base_dir = fu.get_root_dir()
 config_path = os.path.join(base_dir, 'config.yaml')
 
+# Default settings, anything missing from the config file is filled in from here
+# so older config files keep working when new settings are added
+DEFAULTS = {
+    'refresh_rate': 0.1,
+    'preserve_feed_position': False,
+    'clear_logs': False,
+    # Image cache size in megabytes
+    'image_cache_size': 50,
+    # Seconds before a cached image is checked with the server again
+    'image_cache_max_age': 86400,
+    # How many posts either side of the current one to load replies and images for in advance
+    'prefetch_depth': 2,
+    # Size of the saved posts, profiles and notifications in megabytes
+    'disk_cache_size': 20,
+}
+
 def write_config():
     """Set up the config file"""
-    refresh_rate = 0.1
-    preserve_feed_position = False
-    clear_logs = False
-    config_dict = {
-        'refresh_rate': refresh_rate,
-        'preserve_feed_position': preserve_feed_position,
-        'clear_logs': clear_logs
-    }
     with open(config_path, 'w') as f:
-        yaml.safe_dump(config_dict, f)
+        yaml.safe_dump(DEFAULTS, f)
 
 def read_config():
     """Read the config file"""
@@ -27,4 +35,5 @@ def read_config():
         write_config()
         return read_config()
 
-    return config
+    # Fill in anything the config file doesn't have
+    return {**DEFAULTS, **(config or {})}
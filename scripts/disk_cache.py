@@ -0,0 +1,174 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+from time import time
+import scripts.config as config
+import scripts.executor as executor
+import scripts.file_utils as fu
+
+# Posts, profiles and notifications saved between runs so the first screen comes from disk
+# and the network only has to fill in what's changed
+# Bump this when the tables change, an old database gets thrown away and rebuilt
+SCHEMA_VERSION = 1
+
+db_path = os.path.join(fu.get_home_dir(), '.david_cache', 'david.db')
+
+_config = config.read_config()
+# Size budget in bytes, the least recently used rows are evicted past this
+max_size = int(_config['disk_cache_size'] * 1024 * 1024)
+
+# Only the first page of each feed is saved, that's all we need for the first screen
+FEED_LIMIT = 100
+
+# Tables that hold something by id and when it was last used
+TABLES = {
+    'posts': 'id',
+    'notifications': 'id',
+    'profiles': 'username',
+}
+
+# Writes happen on background threads so the connection is shared behind a lock
+_lock = threading.Lock()
+_connection = None
+# Don't keep trying to open a database we can't open (or have closed)
+_failed = False
+
+def _connect():
+    """Open the database the first time it's needed, None if we can't"""
+    global _connection, _failed
+    if _connection is not None or _failed:
+        return _connection
+    try:
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        connection = sqlite3.connect(db_path, check_same_thread=False)
+        _migrate(connection)
+        _evict(connection)
+        _connection = connection
+    except sqlite3.Error as e:
+        logging.exception(e)
+        _failed = True
+    return _connection
+
+def _migrate(connection):
+    """Create the tables, starting again if they're from another version"""
+    connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    row = connection.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    if row is not None and int(row[0]) == SCHEMA_VERSION:
+        return
+
+    logging.info(f"Rebuilding disk cache (schema {row[0] if row else None} -> {SCHEMA_VERSION})")
+    for table in list(TABLES) + ['feeds']:
+        connection.execute(f"DROP TABLE IF EXISTS {table}")
+    for table, key in TABLES.items():
+        connection.execute(f"CREATE TABLE {table} ({key} TEXT PRIMARY KEY, data TEXT NOT NULL, used REAL NOT NULL)")
+        connection.execute(f"CREATE INDEX {table}_used ON {table} (used)")
+    # Feeds are a list of post (or notification) ids in order
+    connection.execute("CREATE TABLE feeds (name TEXT PRIMARY KEY, ids TEXT NOT NULL, used REAL NOT NULL)")
+    connection.execute("DELETE FROM meta")
+    connection.execute("INSERT INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+    connection.commit()
+
+def _size(connection):
+    """Size of the database file in bytes"""
+    page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+    page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+def _evict(connection):
+    """Throw away the least recently used rows until we're within the size budget
+    Only happens at startup so it never gets in the way"""
+    # Give up after a few rounds, whatever is left is probably the feeds themselves
+    for _ in range(5):
+        if _size(connection) <= max_size:
+            return
+        # Drop the oldest quarter of everything
+        for table in TABLES:
+            count = connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            connection.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY used LIMIT ?)",
+                               (max(1, count // 4),))
+        connection.commit()
+        # Deleting doesn't make the file smaller, vacuuming does
+        connection.execute("VACUUM")
+
+def _run(function, *args):
+    """Run a database function with the connection, logging rather than raising on failure"""
+    with _lock:
+        connection = _connect()
+        if connection is None:
+            return None
+        try:
+            return function(connection, *args)
+        except (sqlite3.Error, ValueError) as e:
+            logging.exception(e)
+            return None
+
+def _load_feed(connection, name, table):
+    row = connection.execute("SELECT ids FROM feeds WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return None
+    ids = json.loads(row[0])
+    key = TABLES[table]
+    rows = connection.execute(f"SELECT {key}, data FROM {table} WHERE {key} IN ({','.join('?' * len(ids))})", ids).fetchall()
+    items = dict(rows)
+    # Anything that has been evicted is skipped
+    return [json.loads(items[id]) for id in ids if id in items]
+
+def _save_feed(connection, name, table, rows):
+    now = time()
+    ids = [id for id, _ in rows]
+    connection.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?)", [(id, data, now) for id, data in rows])
+    connection.execute("INSERT OR REPLACE INTO feeds VALUES (?, ?, ?)", (name, json.dumps(ids), now))
+    connection.commit()
+
+def _load_profile(connection, username):
+    row = connection.execute("SELECT data FROM profiles WHERE username = ?", (username.lower(),)).fetchone()
+    return json.loads(row[0]) if row is not None else None
+
+def _save_profile(connection, username, data):
+    connection.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?)", (username.lower(), data, time()))
+    connection.commit()
+
+def _get_meta(connection, key):
+    row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row is not None else None
+
+def _set_meta(connection, key, value):
+    connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+    connection.commit()
+
+def load_feed(name, table='posts'):
+    """Get the saved posts (or notifications) for a feed as API style dicts, None if we don't have it"""
+    return _run(_load_feed, name, table)
+
+def save_feed(name, items, table='posts'):
+    """Save the first page of a feed in the background"""
+    # Serialise now so the posts can't change under us while they're being written
+    rows = [(str(item['id']), json.dumps(item)) for item in items[:FEED_LIMIT]]
+    executor.submit(_run, _save_feed, name, table, rows)
+
+def load_profile(username):
+    """Get a saved profile, None if we don't have it"""
+    return _run(_load_profile, username)
+
+def save_profile(username, profile):
+    """Save a profile in the background"""
+    executor.submit(_run, _save_profile, username, json.dumps(profile))
+
+def get_meta(key):
+    """Get a saved value (e.g. the David Social version)"""
+    return _run(_get_meta, key)
+
+def set_meta(key, value):
+    """Save a value in the background"""
+    executor.submit(_run, _set_meta, key, value)
+
+def close():
+    """Close the database, anything still trying to write afterwards is dropped"""
+    global _connection, _failed
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+        _failed = True
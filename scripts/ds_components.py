@@ -1,11 +1,63 @@
 import curses
 from datetime import datetime
 from math import floor
+from time import monotonic
 from bs4 import BeautifulSoup
 from scripts.colours import ColourConstants
+from scripts.render import Panel
 import scripts.api_routes as david_api
+import scripts.executor as executor
 import scripts.string_utils as su
-
+import scripts.ascii_cache as ascii_cache
+from scripts.models import Post, Notification
+import scripts.store as store
+from scripts.store import post_key
+import scripts.disk_cache as disk_cache
+import scripts.secrets as secrets
+
+
+class MenuLayout():
+    """Grid positions of menu items for a given terminal width
+    Every item gets a cell as wide as the longest item so the grid is regular
+    apart from the last row which may be ragged"""
+    def __init__(self, items, width):
+        self.width = width
+        self.num_items = len(items)
+        longest_item = max((len(item) for item in items), default=0)
+        cell_width = longest_item + 1
+        # Always at least one column, even if the terminal is tiny
+        self.cols = max(1, width // cell_width)
+        self.num_rows = max(1, -(-self.num_items // self.cols))
+
+        # Define the coordinates of the menu items, centred in their cells
+        self.coords = []
+        for index, item in enumerate(items):
+            row, col = divmod(index, self.cols)
+            centre = round((longest_item - len(item))/2)
+            self.coords.append((col * cell_width + centre, row))
+
+    def row_of(self, index):
+        """Row an item is on"""
+        return index // self.cols
+
+    def col_of(self, index):
+        """Column an item is in"""
+        return index % self.cols
+
+    def row_length(self, row):
+        """Number of items on a row (only the last row can be short)"""
+        return min(self.cols, self.num_items - row * self.cols)
+
+    def index_at(self, row, col):
+        """Index of the item at a row and column, clamped to the end of a ragged row"""
+        return row * self.cols + min(col, self.row_length(row) - 1)
+
+    def move_vertical(self, index, direction):
+        """Index of the item above (direction -1) or below (direction 1), wrapping top to bottom"""
+        if self.num_items == 0:
+            return index
+        row = (self.row_of(index) + direction) % self.num_rows
+        return self.index_at(row, self.col_of(index))
 
 class Menu():
     def __init__(self, stdscr, items, states):
@@ -19,25 +71,28 @@ class Menu():
         self.cols = 0
         self.rows = 0
         self.selection = 0
+        # Last key read, -1 if there wasn't one
+        self.last_key = -1
+        # The menu draws into its own window along the bottom of the screen
+        self.panel = Panel()
+        # Layout is cached until the items or terminal width change
+        self.layout = None
         # Used for spacing
         if len(self.items) > 0:
             self.longest_item = len(max(self.items, key=len))
         else:
             self.longest_item = 0
 
-    def clear_row(self, row):
-        """Blank out the specified row"""
-        _, width = curses.initscr().getmaxyx()
-        self.stdscr.addstr(row, 0, " " * (width - 1), self.cols)
-
     def get_key(self, key, key_check):
         """Check if a key is pressed"""
         return 1 if key == key_check else 0
 
     def update(self):
         """Navigation with curses"""
-        self.stdscr.nodelay(True)
+        # The main loop has already waited for input so this doesn't block
         key = self.stdscr.getch()
+        self.last_key = key
+        previous_selection = self.selection
 
         # Jank ass way of getting input lmao
         hinput = self.get_key(key, curses.KEY_RIGHT) - self.get_key(key, curses.KEY_LEFT)
@@ -50,13 +105,13 @@ class Menu():
             if self.selection >= len(self.items):
                 self.selection = 0
 
-        # Vinput is more annoying to handle
-        if vinput != 0 and self.rows > 0:
-            self.selection += self.cols * vinput
-            if self.selection < 0:
-                self.selection = self.cols * self.rows + self.selection
-            if self.selection >= len(self.items):
-                self.selection = len(self.items) - 1
+        # Vinput moves between rows of the layout
+        if vinput != 0 and self.layout is not None and self.layout.num_rows > 1:
+            self.selection = self.layout.move_vertical(self.selection, vinput)
+
+        # Moving the selection only needs the menu window redrawing
+        if self.selection != previous_selection:
+            self.render()
 
         if key == curses.KEY_ENTER or key == 10 or key == 13:
             return self.states[self.selection]
@@ -87,11 +142,14 @@ class Menu():
 
         # Update longest item
         self.longest_item = len(max(self.items, key=len))
+        # Items have changed so the layout needs recomputing
+        self.layout = None
 
     def clear_menu(self):
         """Remove all menu items"""
         self.items = []
-        self.functions = []
+        self.states = []
+        self.layout = None
 
     def has_item(self, item):
         """Check if the menu has an item"""
@@ -105,49 +163,45 @@ class Menu():
         """Return the menu items as a copy"""
         return self.items.copy()
 
+    def get_layout(self, width):
+        """Get the layout for the terminal width, only recomputing it if something changed"""
+        if self.layout is None or self.layout.width != width:
+            self.layout = MenuLayout(self.items, width)
+            # Rows is the number of extra rows beyond the first
+            self.rows = self.layout.num_rows - 1
+            self.cols = self.layout.cols
+        return self.layout
+
     def draw(self):
         """Draw the menu"""
-        # Reset rows and columns
-        self.rows = 0
-        self.cols = 0
         # Get the height and width of the terminal
-        height, width = curses.initscr().getmaxyx()
-
-        # Define the coordinates of the menu items
-        coords = []
-        current_width = 0
-        count_cols = True
-        for item in self.items:
-            if current_width + self.longest_item + 1 > width:
-                current_width = 0
-                self.rows += 1
-                centre = round((self.longest_item - len(item))/2)
-                coords.append((current_width + centre, self.rows))
-                count_cols = False
-            else:
-                # Counts how many columns there are
-                if count_cols:
-                    self.cols += 1
-                # Append this before adjusting the width
-                centre = round((self.longest_item - len(item))/2)
-                coords.append((current_width + centre, self.rows))
-
-            # Consistent spacing
-            current_width += self.longest_item + 1
-
-        # Set initial drawing coordinates
-        x = 0
-        y = height - self.rows - 1
-
-        # Blank rows
-        for row in range(y, height):
-            self.clear_row(row)
+        height, width = self.stdscr.getmaxyx()
+        self.get_layout(width)
+
+        # Move the menu window to the bottom rows and draw into it
+        self.panel.place(self.rows + 1, width, height - self.rows - 1, 0)
+        self.render()
+
+    def render(self):
+        """Draw the menu items into the menu window"""
+        window = self.panel.window
+        if window is None or self.layout is None:
+            return
+
+        # Blank the window
+        window.erase()
 
         # Print menu items
-        for item in self.items:
-            x_offset, y_offset = coords.pop(0)
-            col = self.colours.HIGHLIGHT if self.selection == self.items.index(item) else self.colours.WHITE_BLACK
-            self.stdscr.addstr(y + y_offset, x + x_offset, item, col)
+        for index, item in enumerate(self.items):
+            x_offset, y_offset = self.layout.coords[index]
+            col = self.colours.HIGHLIGHT if self.selection == index else self.colours.WHITE_BLACK
+            # Curses errors writing to the last cell of a window
+            try:
+                window.addstr(y_offset, x_offset, item, col)
+            except curses.error:
+                pass
+
+        self.panel.mark_dirty()
 
     def get_rows(self):
         """Return the height of the menu"""
@@ -159,70 +213,117 @@ class Ticker():
         # Initialise the colour constants
         self.colours = ColourConstants()
         self.colours.init_colours()
-        _, width = curses.initscr().getmaxyx()
         self.stdscr = stdscr
         # Get the ticker, we default to None
         # This allows us to override and make a custom marquee
         self.text = text
+        self.request = None
+        # Whether we have real ticker text yet (as opposed to a placeholder)
+        self.has_text = text is not None
         if text is None:
             self.get_ticker()
-        self.ticker_x = 0
-        self.ticker_spacing = max(round(width * 0.2), 2)
-        self.t = datetime.now()
         self.ticker = self.text
         self.ticker_update_rate = 0.2
+        # Scroll position is worked out from how long the ticker has been running
+        self.start = monotonic()
+
+        # Text repeated enough times that any window onto it is a single slice
+        # Rebuilt only when the text or terminal width changes
+        self.buffer = ""
+        self.buffer_key = None
+        self.ticker_spacing = 2
+        self.period = 1
+        # Which slice of the buffer is currently showing
+        self.position = None
+        # The ticker has its own one line window at the top of the screen
+        self.panel = Panel()
 
     def get_ticker(self):
-        """Get new ticker text from the API"""
-        r = david_api.query_api("get-ticker-text")
+        """Get new ticker text from the API in the background"""
+        self.request = david_api.query_api_async("get-ticker-text")
+        # Scroll a placeholder while we wait
+        if self.text is None:
+            self.text = "Loading ticker..."
+
+    def poll(self):
+        """Check on the ticker request, updating the text when it arrives"""
+        if self.request is None or not self.request.done():
+            return
+
+        r = executor.result(self.request)
+        self.request = None
         if r is not None:
             # Parse the ticker text - it's in html
             soup = BeautifulSoup(r['tickerText'], "html.parser")
             # Extract the text from the soup
             self.text = soup.text.strip()
-        elif self.text is not None:
-            return
-        else:
+            self.has_text = True
+        elif not self.has_text:
             self.text = "Ticker text not found :("
 
+    def set_text(self, text):
+        """Replace the ticker text"""
+        self.text = text
+        self.has_text = True
+
+    def build_buffer(self, width):
+        """Precompute the scrolling text for the current text and width"""
+        # Update spacing based on Terminal width
+        self.ticker_spacing = max(round(width * 0.2), 2)
+        unit = self.text + " " * self.ticker_spacing
+        # Scroll position wraps around after one lot of text and spacing
+        self.period = len(unit)
+        # Enough repeats that a slice starting anywhere in the first period fills the screen
+        repeats = -(-(self.period + width) // self.period)
+        self.buffer = unit * repeats
+        self.buffer_key = (self.text, width)
 
     def update(self):
         """Updates the ticker text"""
-        _, width = curses.initscr().getmaxyx()
+        self.poll()
+        _, width = self.stdscr.getmaxyx()
         # Overflow protection
         width -= 1
-        # Update spacing basedd on Terminal width
-        self.ticker_spacing = max(round(width * 0.2), 2)
-
-        # Update the ticker text position
-        dt = datetime.now() - self.t
-        if dt.total_seconds() > self.ticker_update_rate:
-            self.t = datetime.now()
-            self.ticker_x += 1
 
-        # Wrap ticker_x
-        if self.ticker_x >= len(self.text) + self.ticker_spacing:
-            self.ticker_x = 0
+        if self.buffer_key != (self.text, width):
+            self.build_buffer(width)
 
-        # Update the actual text to display
-        self.ticker = list(self.text) + list(" " * self.ticker_spacing) + list(self.text)
-        # Add enough repeats of the ticker text to fill the screen
-        while len(self.ticker) < width * 2:
-            self.ticker = self.ticker + list(" " * self.ticker_spacing) + self.ticker
-
-        # Slice the ticker text to fit the screen
-        self.ticker = self.ticker[self.ticker_x:self.ticker_x + width - 1]
-
-        # Join the ticker back into a string
-        self.ticker = "".join(self.ticker)
+        # Update the ticker text position
+        ticker_x = int((monotonic() - self.start) / self.ticker_update_rate) % self.period
+
+        # Only touch the window if the visible text has moved
+        position = (ticker_x, self.buffer_key)
+        if position != self.position:
+            self.position = position
+            # Slice the ticker text to fit the screen
+            self.ticker = self.buffer[ticker_x:ticker_x + width - 1]
+            self.render()
+
+    def next_deadline(self):
+        """Seconds until the ticker next scrolls"""
+        return self.ticker_update_rate - (monotonic() - self.start) % self.ticker_update_rate
+
+    def render(self):
+        """Draw the ticker text into the ticker window"""
+        _, width = self.stdscr.getmaxyx()
+        self.panel.place(1, width, 0, 0)
+        window = self.panel.window
+        window.erase()
+        # Print the ticker with a colour pair
+        try:
+            window.addstr(0, 0, self.ticker, curses.A_ITALIC | self.colours.YELLOW_BLACK)
+        except curses.error:
+            pass
+        self.panel.mark_dirty()
 
     def draw(self):
         """Prints the ticker text with scrolling"""
-        # Print the ticker with a colour pair
-        self.stdscr.addstr(self.ticker, curses.A_ITALIC | self.colours.YELLOW_BLACK)
+        self.render()
 
 class AsciiImage():
-    """Ascii image class"""
+    """Ascii image class
+    Images are downloaded in the background and converted in a worker process
+    so a big photo never holds up input, the art shows up when it's ready"""
     def __init__(self, stdscr, image_path, url, centre=True, dim_adjust=(0, 0)):
         """Initialise the ascii image"""
         self.stdscr = stdscr
@@ -236,6 +337,19 @@ class AsciiImage():
         self.max_width = 0
         self.max_height = 0
 
+        # The image draws into its own window wherever the state puts it
+        self.panel = Panel()
+        # The ascii currently in the window
+        self.drawn = None
+
+        # Background work: the image bytes are fetched once, then converted for each size we need
+        self.fetch_request = None
+        self.content = None
+        self.render_request = None
+        # Cache key of the art being rendered and of the art that's showing
+        self.pending_key = None
+        self.key = None
+
         # Initial image generation
         self.generate_image()
 
@@ -243,23 +357,95 @@ class AsciiImage():
     def generate_image(self):
         """Generate the ascii image"""
         # Set the max width and height
-        self.max_height, self.max_width = curses.initscr().getmaxyx()
+        self.max_height, self.max_width = self.stdscr.getmaxyx()
 
-        # Delete ascii if it exists
-        if self.ascii:
-            del self.ascii
+        # Reuse the art if we've already rendered this image at this size
+        width, height = su.get_available_size(self.dim_adjust, self.stdscr)
+        key = ascii_cache.make_key(self.image_url, width, height, "".join(su.ascii_chars), self.dim_adjust)
+        if key == self.pending_key:
+            return
+        if key == self.key:
+            # Already showing it, drop anything rendering for another size (e.g. resized and back again)
+            # so it doesn't replace this when it finishes
+            self.cancel()
+            return
+        ascii = ascii_cache.cache.get(key)
+        if ascii is not None:
+            self.cancel()
+            self.set_ascii(key, ascii)
+            return
 
-        self.ascii = su.image_to_ascii(self.image_url, self.url, dim_adjust=self.dim_adjust)
+        # Otherwise render it in the background, keeping the old art up until then
+        self.cancel()
+        self.pending_key = key
+        if self.content is not None:
+            self.render_request = executor.submit_cpu(su.bytes_to_ascii, self.content, width, height)
+        elif self.fetch_request is None:
+            self.fetch_request = executor.submit(su.load_image_bytes, self.image_url, self.url)
+
+    def set_ascii(self, key, ascii):
+        """Show some rendered art"""
+        self.key = key
+        self.ascii = ascii
         # Centre the ascii image if required
         if self.centre:
             # Get the width of the ascii image
             ascii_width = len(self.ascii.split("\n")[0])
             # Get the width of the terminal
-            _, max_width = curses.initscr().getmaxyx()
+            _, max_width = self.stdscr.getmaxyx()
             # Centre the ascii image
             centre = floor((max_width - ascii_width)/2)
             self.ascii = "\n".join([" "*centre + line for line in self.ascii.split("\n")])
 
+    def poll(self):
+        """Pick up finished background work
+        Returns: True if the art has changed"""
+        if self.fetch_request is not None and self.fetch_request.done():
+            self.content = executor.result(self.fetch_request)
+            self.fetch_request = None
+            if self.content is None:
+                # Nothing to draw, don't keep trying
+                self.pending_key = None
+                return False
+            if self.pending_key is None:
+                # The art we were fetching for came out of the cache in the meantime
+                return False
+            # Now we have the image we can convert it
+            _, width, height, _, _ = self.pending_key
+            self.render_request = executor.submit_cpu(su.bytes_to_ascii, self.content, width, height)
+
+        if self.render_request is None or not self.render_request.done():
+            return False
+
+        ascii = executor.result(self.render_request)
+        key = self.pending_key
+        self.render_request = None
+        self.pending_key = None
+        if ascii is None:
+            return False
+        ascii_cache.cache.put(key, ascii)
+        self.set_ascii(key, ascii)
+        return True
+
+    def is_loading(self):
+        """Check if the image is still being fetched or converted"""
+        return self.fetch_request is not None or self.render_request is not None
+
+    def cancel(self):
+        """Drop art that's still being rendered, e.g. because we've moved on to another post
+        Jobs that haven't started are cancelled, running ones are left to finish and ignored"""
+        if self.render_request is not None:
+            self.render_request.cancel()
+            self.render_request = None
+        self.pending_key = None
+
+    def close(self):
+        """Stop all background work for the image"""
+        self.cancel()
+        if self.fetch_request is not None:
+            self.fetch_request.cancel()
+            self.fetch_request = None
+
     def get_dims(self):
         return len(self.ascii.split("\n")) - self.dim_adjust[1], len(self.ascii.split("\n")[0]) - self.dim_adjust[0]
 
@@ -269,8 +455,9 @@ class AsciiImage():
 
     def update(self):
         """Check if the image requires updating due to terminal resize"""
+        self.poll()
         # Get terminal size
-        t_height, t_width = curses.initscr().getmaxyx()
+        t_height, t_width = self.stdscr.getmaxyx()
         # Check if the terminal size has changed
         if t_height != self.max_height or t_width != self.max_width:
             self.generate_image()
@@ -279,8 +466,58 @@ class AsciiImage():
             self.max_width = t_width
 
     def draw(self):
-        """Draw the ascii image"""
-        self.stdscr.addstr(self.ascii)
+        """Draw the ascii image at the cursor position"""
+        self.poll()
+        # Nothing to draw until the first render arrives
+        if self.ascii is None:
+            return
+
+        y, _ = self.stdscr.getyx()
+        max_height, max_width = self.stdscr.getmaxyx()
+        lines = self.ascii.split("\n")
+        height = min(len(lines), max_height - y)
+
+        # Only redraw the window contents if it has moved or the image has changed
+        if self.panel.place(height, max_width, y, 0) or self.drawn is not self.ascii:
+            window = self.panel.window
+            window.erase()
+            for row, line in enumerate(lines[:height]):
+                # Curses errors writing to the last cell of a window
+                try:
+                    window.addstr(row, 0, line)
+                except curses.error:
+                    pass
+            self.drawn = self.ascii
+            self.panel.mark_dirty()
+
+        # Leave the cursor after the image like addstr would
+        self.stdscr.move(min(y + height, max_height - 1), 0)
+
+def placeholder_post(content):
+    """A fake post from David for when there's no real post to show
+    Has the notification keys too so it can sit in the notifications feed"""
+    return {
+        "id": "0",
+        "username": "David",
+        "content": content,
+        "likes": 0,
+        "avi": "",
+        "attached_image": "",
+        "userid": None,
+        "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "reply_to": None,
+        "liked_by": [],
+        "ncomments": 0,
+        "david_selection": False,
+        "actor": "David",
+        "url": "",
+        "snippet": content,
+        "type": "4",
+    }
+
+# Whether the server understands the 'before' cursor for each feed route
+# Not known until we've tried it, older servers ignore it and send the first window again
+cursor_support = {}
 
 class Feed():
     def __init__(self, session, type="Bootlicker", additional_params=None):
@@ -308,35 +545,149 @@ class Feed():
             self.api_route = "get-post"
             self.params = [additional_params]
 
-        # Query the api
+        # Posts are stored as models built when they arrive
+        self.model = Notification if self.type == "Notifications" else Post
+        # Posts are shared with every other feed through the store
+        if self.model is Post:
+            store.register_feed(self)
+
+        # Request for loading more posts, if there is one in flight, and the cursor it was sent with
+        self.more_request = None
+        self.more_cursor = None
+
+        self.posts = []
+        # Position of each post by id so lookups don't have to search the feed
+        # Positions are stored offset by base so posts can be added to the front without renumbering
+        self.index = {}
+        self.base = 0
+        self.post_index = 0
+        # Set while we're showing posts saved from last time
+        self.showing_saved = False
+
+        self.disk_name = self.get_disk_name(additional_params)
+
+        # No need to ask for a single post if we've already got it
+        cached = store.get_post(additional_params) if self.type == "Post" else None
+        if cached is not None:
+            self.request = None
+            self.set_posts_list([cached])
+            return
+
+        # Query the api in the background
         # The window is a parameter which we can hold on to if we wish to load more posts
-        self.posts = david_api.query_api(self.api_route, params=self.params, cookies=self.session.cookies)
+        self.request = david_api.query_api_async(self.api_route, params=list(self.params), cookies=self.session.cookies)
 
+        # Show what we saved last time while the feed refreshes, or a placeholder if we don't have anything
+        saved = disk_cache.load_feed(self.disk_name, self.get_disk_table())
+        self.showing_saved = bool(saved)
+        if saved:
+            self.set_posts_list([self.make_saved_post(post) for post in saved])
+        else:
+            self.set_posts_list([self.model(placeholder_post("Loading posts..."))])
+
+    def get_disk_name(self, additional_params):
+        """Name the feed is saved under, the bootlicker feed and notifications depend on who's logged in"""
+        if self.type in ["Bootlicker", "Notifications"]:
+            return f"{self.type}:{(secrets.get_username() or '').lower()}"
+        if additional_params is not None:
+            return f"{self.type}:{additional_params}"
+        return self.type
+
+    def get_disk_table(self):
+        """Table the feed's posts are saved in"""
+        return "notifications" if self.model is Notification else "posts"
+
+    def save(self):
+        """Save the start of the feed so it can be shown straight away next time"""
+        # Leave out placeholders (no posts, loading...)
+        posts = [post for post in self.posts[:disk_cache.FEED_LIMIT] if post.id != "0"]
+        disk_cache.save_feed(self.disk_name, [post.to_json() for post in posts], self.get_disk_table())
+
+    def make_post(self, data):
+        """Build a post from the API, posts come from the store so there's only ever one of each"""
+        if self.model is Post:
+            return store.put_post(data)
+        return self.model(data)
+
+    def make_saved_post(self, data):
+        """Build a post saved from last time, posts we've already loaded this run are newer so they're kept"""
+        if self.model is Post:
+            return store.put_saved_post(data)
+        return self.model(data)
+
+    def is_loading(self):
+        """Check if the initial posts are still being fetched (and we've got nothing saved to show)"""
+        return self.request is not None and not self.showing_saved
+
+    def poll(self):
+        """Check on background requests
+        Returns: True if the posts have changed"""
+        changed = False
+        if self.request is not None and self.request.done():
+            self.set_posts(executor.result(self.request))
+            self.request = None
+            changed = True
+
+        if self.more_request is not None and self.more_request.done():
+            new_posts = executor.result(self.more_request)
+            self.more_request = None
+            changed = self.merge_more_posts(new_posts) or changed
+
+        return changed
+
+    def set_posts(self, posts):
+        """Set the posts from an API response"""
         # Get-post route returns a single post so we need to put it in a list
-        if not isinstance(self.posts, list) and self.posts is not None:
-            self.posts = [self.posts]
+        if not isinstance(posts, list) and posts is not None:
+            posts = [posts]
+
+        # If we couldn't refresh the saved posts then stick with them
+        showing_saved = self.showing_saved
+        self.showing_saved = False
+        if posts is None and showing_saved:
+            return
 
         # Now we've got our feed let's see if there's anything in it
         # (Also handles failure to retrieve posts)
-        if len(self.posts) == 0 or self.posts is None:
+        if posts is None or len(posts) == 0:
             # Create a post saying there are no posts
-            post = {
-                "id": "0",
-                "username": "David",
-                "content": "There are no posts to display also David didn't actually post this",
-                "likes": 0,
-                "avi": "",
-                "attached_image": "",
-                "userid": None,
-                "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-                "reply_to": None,
-                "liked_by": [],
-                "ncomments": 0,
-                "david_selection": False
-            }
-            self.posts = [post]
+            self.set_empty()
+            return
 
-        self.post_index = 0
+        # If we were already reading the saved posts keep our place
+        current = self.get_post_id(self.post_index) if showing_saved else None
+        self.set_posts_list([self.make_post(post) for post in posts])
+        if current is not None:
+            self.post_index = self.get_post_index(current) or 0
+        self.save()
+
+    def set_empty(self):
+        """Show a post saying there are no posts"""
+        self.set_posts_list([self.model(placeholder_post("There are no posts to display also David didn't actually post this"))])
+
+    def set_posts_list(self, posts):
+        """Replace all the posts and rebuild the index"""
+        self.posts = []
+        self.index = {}
+        self.base = 0
+        self.append_posts(posts)
+
+    def append_posts(self, posts):
+        """Add posts to the end of the feed"""
+        for post in posts:
+            self.index[post_key(post.id)] = self.base + len(self.posts)
+            self.posts.append(post)
+
+    def prepend_posts(self, posts):
+        """Add posts to the start of the feed, in the order given"""
+        self.base -= len(posts)
+        for i, post in enumerate(posts):
+            self.index[post_key(post.id)] = self.base + i
+        self.posts[0:0] = posts
+
+    def has_post(self, id):
+        """Check if a post is in the feed"""
+        return post_key(id) in self.index
 
     def get_post(self, index):
         """Get a post from the feed"""
@@ -346,29 +697,49 @@ class Feed():
         """Update a post in the feed"""
         # Query the api
         post = david_api.query_api("get-post", params=[self.get_post_id(index)], cookies=self.session.cookies)
-        # Replace the post in the feed
+        if post is None:
+            return None
+        # Replace the post in the feed (the store updates it everywhere else)
+        post = self.make_post(post)
         self.posts[index] = post
+        self.index[post_key(post.id)] = self.base + index
+        self.save()
 
         return post
 
     def delete_post(self, index):
         """Remove a post from the feed"""
         # Remove the post from the feed
+        del self.index[post_key(self.posts[index].id)]
         del self.posts[index]
+        # Everything after it has moved up one, deleting is rare so this is fine
+        for i in range(index, len(self.posts)):
+            self.index[post_key(self.posts[i].id)] = self.base + i
         # Post index remains the same, but we need to reduce window by 1 if we're on bootlicker feed
         if self.type == "Bootlicker":
             self.params[0] -= 1
 
+    def drop_post(self, id):
+        """Take a deleted post out of the feed, keeping our place"""
+        index = self.get_post_index(id)
+        if index is None:
+            return
+        self.delete_post(index)
+        if index < self.post_index:
+            self.post_index -= 1
+        if len(self.posts) == 0:
+            self.set_empty()
+        self.post_index = min(self.post_index, len(self.posts) - 1)
+        self.save()
+
     def get_post_id(self, index):
         """Get the post id from the feed"""
-        return self.posts[index]["id"]
+        return self.posts[index].id
 
     def get_post_index(self, id):
         """Returns the index of a post with a given id"""
-        # Enforce typing otherwise we get issues with type mismatch
-        indices = [int(post["id"]) for post in self.posts]
-        id = int(id)
-        return indices.index(id) if id in indices else None
+        position = self.index.get(post_key(id))
+        return None if position is None else position - self.base
 
     def get_replies(self, index):
         """Get the replies to a post"""
@@ -378,96 +749,173 @@ class Feed():
 
     def has_image(self, index):
         """Check if a post has an image"""
-        return self.posts[index]["attached_image"] != ""
+        return self.posts[index].attached_image != ""
 
     def get_image(self, index):
         """Get the image from a post"""
-        return self.posts[index]["attached_image"]
+        return self.posts[index].attached_image
 
     def update(self, presrve_pos):
         """Update the feed"""
         # Query the api
         new_posts = david_api.query_api(self.api_route, params=self.params, cookies=self.session.cookies)
-        # We need to loop through the new posts until we hit a post that is already in the feed
+        if new_posts is None:
+            return
+        self.merge_new_posts(new_posts, presrve_pos)
+
+    def merge_new_posts(self, new_posts, presrve_pos):
+        """Add newer posts from a refresh to the top of the feed"""
+        # Add any posts that aren't already in the feed (apart from David selections) to the top
+        added = []
+        # Stop duplicates in the response being added twice
+        seen = set()
         for post in new_posts:
-            if post not in self.posts:
-                # Add the post to the feed if it isn't a David selection
-                if not post["david_selection"]:
-                    self.posts = [post] + self.posts
-                    # Also increment the post index - if we preserve the post index then we can keep the user in the same place
-                    if presrve_pos:
-                        self.post_index += 1
+            key = post_key(post["id"])
+            if key not in self.index and key not in seen and not post["david_selection"]:
+                added.append(self.make_post(post))
+                seen.add(key)
+        self.prepend_posts(added)
+        # Also move the post index - if we preserve the post index then we can keep the user in the same place
+        if presrve_pos:
+            self.post_index += len(added)
+        if added:
+            self.save()
 
     def load_more_posts(self):
-        """Load more posts
-        Returns: True if more posts were loaded, False if there are no more posts"""
-        # This will cause problems if more than 50 posts have been posted to Bootlicker feed since the user last loaded it
-        # I'm going to use the ostrich method and ignore this problem
+        """Start loading more posts in the background
+        Returns: True if a request was started, False if there are no more posts to load"""
         no_load = ["User", "Reply", "Notifications", "Post"]
+        # Wait for saved posts to be refreshed too, they're about to be replaced
+        if self.type in no_load or self.request is not None or self.more_request is not None:
+            return False
+
+        # Ask for the posts older than the oldest one we have so every page costs the same
+        # If the server doesn't do cursors we have to grow the window and download everything again
+        cursor = self.get_cursor()
+        if cursor is not None and cursor_support.get(self.api_route, True):
+            params = list(self.params) + [cursor]
+        else:
+            cursor = None
+            self.grow_window()
+            params = list(self.params)
+
+        self.more_request = david_api.query_api_async(self.api_route, params=params, cookies=self.session.cookies)
+        self.more_cursor = cursor
+        return True
+
+    def grow_window(self):
+        """Make the window bigger for servers that don't support cursors"""
         if self.type == "Bootlicker":
             self.params[0] += 50
         elif self.type == "Global":
             self.params[0] += 1
-        elif self.type in no_load:
-            return False
 
-        # Query the api with the new window size
-        new_posts = david_api.query_api(self.api_route, params=self.params, cookies=self.session.cookies)
+    def get_cursor(self):
+        """Id of the oldest post we have to page from, skipping David selections
+        since they get dropped in anywhere"""
+        for post in reversed(self.posts):
+            if not post.david_selection:
+                return int(post.id)
+        return None
 
-        # We now have the annoying problem of David 'Intelligence' being inserted into the posts list
-        # So basically we need to find the last post in self.posts in the new posts list
-        # This loop ensures we don't pick a David Selection as the last post
-        i = -1
-        while self.posts[i]["david_selection"]:
-            i -= 1
-            # Failsafe to prevent infinite loop
-            if -i > len(self.posts):
-                return False
+    def is_loading_more(self):
+        """Check if more posts are being fetched"""
+        return self.more_request is not None
 
-        last_post = self.posts[-i]
-        # This actually crashes so lazy try except to make sure it doesn't break
-        try:
-            # Find the index of the last post
-            last_post_index = new_posts.index(last_post)
-            # There is an exception if (somehow) we reach the end of the feed
-            if last_post_index == len(new_posts) - 1:
-                # In this case we don't need to do anything
-                return False
-        except:
+    def merge_more_posts(self, new_posts):
+        """Add newly loaded posts onto the end of the feed
+        Returns: True if more posts were loaded, False if there are no more posts"""
+        if new_posts is None:
             return False
-        # Now slice the new posts list to get the new posts
-        new_posts = new_posts[last_post_index + 1:]
-        # Now we can append the new posts to the old posts
-        self.posts += new_posts
-        return True
+
+        cursor = self.more_cursor
+        self.more_cursor = None
+        if cursor is not None and self.api_route not in cursor_support:
+            # If we got anything at or after the cursor back the server ignored it
+            ignored = any(int(post["id"]) >= cursor for post in new_posts if not post["david_selection"])
+            cursor_support[self.api_route] = not ignored
+            if ignored:
+                # Nothing new in there, try again the old way
+                self.load_more_posts()
+                return False
+
+        # Posts are merged by id so whatever overlaps with what we have is skipped
+        added = 0
+        for post in new_posts:
+            if not self.has_post(post["id"]):
+                self.append_posts([self.make_post(post)])
+                added += 1
+        # Only the start of the feed is saved so there's nothing to do if we're past it
+        if added and len(self.posts) - added < disk_cache.FEED_LIMIT:
+            self.save()
+        return added > 0
 
 class Profile():
     def __init__(self, session, username):
         """Create profile"""
         self.session = session
         self.username = username
-        self.profile = david_api.query_api("profile", params=[self.username], cookies=self.session.cookies)
+        # Fetch the profile in the background
+        # If we've seen it before (this run or saved from last time) show that straight away, otherwise a placeholder until it arrives
+        self.request = david_api.query_api_async("profile", params=[self.username], cookies=self.session.cookies)
+        self.profile = store.get_profile(self.username)
+        if self.profile is None:
+            saved = disk_cache.load_profile(self.username)
+            if saved is not None:
+                self.profile = store.put_profile(self.username, saved)
+        self.loaded = self.profile is not None
+        if self.profile is None:
+            self.profile = self.placeholder_profile("Loading profile...")
+
+    def placeholder_profile(self, text):
+        """Dummy profile for when we don't have a real one"""
+        return {
+            "username": self.username,
+            "name": "David",
+            "bio": text,
+            "facts": {},
+            "avi": "",
+            "bootlickers": [],
+            "following": [],
+            "posts": [],
+            "status": text,
+        }
+
+    def is_loading(self):
+        """Check if we're still waiting for the profile"""
+        return not self.loaded
+
+    def poll(self):
+        """Check on the background request
+        Returns: True if the profile has arrived"""
+        if self.request is None or not self.request.done():
+            return False
+
+        self.set_profile(executor.result(self.request))
+        self.request = None
+        return True
 
+    def set_profile(self, profile):
+        """Set the profile from an API response"""
         # If the profile is None then we need to create a dummy profile
-        if self.profile is None:
-            self.profile = {
-                "username": self.username,
-                "name": "David",
-                "bio": "This user doesn't exist or this is a bug",
-                "facts": {},
-                "avi": "",
-                "bootlickers": [],
-                "following": [],
-                "posts": [],
-                "status": "This user doesn't exist or this is a bug",
-            }
+        if profile is None:
+            # Unless we already have it, then we just couldn't refresh it
+            if self.loaded:
+                return
+            profile = self.placeholder_profile("This user doesn't exist or this is a bug")
         else:
             # Remove any dictionary keys from facts that are empty strings
-            self.profile["facts"] = {k: v for k, v in self.profile["facts"].items() if v != ""}
+            profile["facts"] = {k: v for k, v in profile["facts"].items() if v != ""}
             # No username key in profile so we need to add it
-            self.profile["username"] = self.username
+            profile["username"] = self.username
             # Bio may have default text which is "null", replace that with an empty string
-            self.profile["bio"] = self.profile["bio"].replace("null", "")
+            profile["bio"] = profile["bio"].replace("null", "")
+            # Everyone looking at this profile shares the same copy
+            profile = store.put_profile(self.username, profile)
+            disk_cache.save_profile(self.username, profile)
+
+        self.profile = profile
+        self.loaded = True
 
     def get_profile(self):
         """Return the profile"""
@@ -0,0 +1,135 @@
+import os
+import logging
+import multiprocessing
+import scripts.tracer as tracer
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Background workers for network calls so the UI never has to wait on the server
+# Requests are I/O bound so threads are fine, the GIL is released while we wait on sockets
+MAX_WORKERS = 4
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="david-bg")
+
+# CPU heavy work (decoding and converting images) goes to separate processes so it can't hold
+# the GIL while we're trying to handle input. Workers come from a forkserver rather than being
+# forked from us, we've got threads running by then and forking those isn't safe (a lock held
+# by another thread stays held forever in the child). The forkserver imports string_utils once
+# so workers start quickly. Where there's no forkserver (Windows) we fall back to the thread pool
+MAX_PROCESSES = 2
+_process_pool = None
+_can_fork = "forkserver" in multiprocessing.get_all_start_methods()
+
+# Futures that haven't finished yet
+_in_flight = set()
+
+# Self-pipe so the main loop can sleep until a job finishes instead of polling
+# A byte is written every time a job completes
+# Windows can't select() on pipes so it goes without and the main loop polls instead
+if os.name != "nt":
+    _wake_r, _wake_w = os.pipe()
+    os.set_blocking(_wake_r, False)
+    os.set_blocking(_wake_w, False)
+else:
+    _wake_r, _wake_w = None, None
+
+def _finished(future):
+    """Stop tracking a future once it is done and wake up the main loop"""
+    _in_flight.discard(future)
+    if _wake_w is None:
+        return
+    try:
+        os.write(_wake_w, b"\0")
+    except (BlockingIOError, OSError):
+        # Pipe is full so the main loop is already due to wake up
+        pass
+
+def _track(future):
+    """Keep track of a future until it is done"""
+    _in_flight.add(future)
+    future.add_done_callback(_finished)
+    return future
+
+def submit(function, *args, **kwargs):
+    """Run a function in the background, returns a future"""
+    return _track(_pool.submit(function, *args, **kwargs))
+
+def submit_cpu(function, *args):
+    """Run a CPU bound function in a worker process, returns a future
+    The function and its arguments have to be picklable"""
+    global _process_pool, _can_fork
+    if _can_fork:
+        try:
+            if _process_pool is None:
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["scripts.string_utils"])
+                _process_pool = ProcessPoolExecutor(max_workers=MAX_PROCESSES, mp_context=context)
+            if tracer.enabled():
+                return _track(_traced(_process_pool.submit(tracer.call_traced, tracer.origin(), function, *args)))
+            return _track(_process_pool.submit(function, *args))
+        except (BrokenProcessPool, OSError) as e:
+            # Can't make processes for some reason so just use threads from now on
+            logging.exception(e)
+            _can_fork = False
+    return submit(function, *args)
+
+def _traced(future):
+    """Future for the result of a job run with tracer.call_traced, adding the events
+    the worker process recorded to our trace when it finishes"""
+    outer = Future()
+
+    def done(inner):
+        try:
+            result, events = inner.result()
+        except BaseException as e:
+            if not outer.cancelled():
+                outer.set_exception(e)
+            return
+        tracer.merge(events)
+        # Cancelled while it was running so nobody wants the result
+        if not outer.cancelled():
+            outer.set_result(result)
+
+    future.add_done_callback(done)
+    # Pass cancelling on to the job so it doesn't run if it hasn't started
+    outer.add_done_callback(lambda outer: outer.cancelled() and future.cancel())
+    return outer
+
+def pending():
+    """Number of submitted jobs that haven't finished"""
+    return len(_in_flight)
+
+def saturated():
+    """Check if there's already enough queued up to keep every worker busy"""
+    return pending() >= MAX_WORKERS
+
+def wake_fd():
+    """File descriptor that becomes readable when a background job finishes (None on Windows)"""
+    return _wake_r
+
+def drain_wakeups():
+    """Clear the wake pipe, returns True if any jobs finished since the last call"""
+    woken = False
+    if _wake_r is None:
+        return woken
+    while True:
+        try:
+            if not os.read(_wake_r, 512):
+                return woken
+            woken = True
+        except (BlockingIOError, OSError):
+            return woken
+
+def result(future, default=None):
+    """Get the result of a finished future, logging and returning default if it raised"""
+    try:
+        return future.result()
+    except Exception as e:
+        logging.exception(e)
+        return default
+
+def shutdown():
+    """Stop the workers, anything not started yet is dropped"""
+    _pool.shutdown(wait=False, cancel_futures=True)
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,170 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from time import time
+import scripts.api_routes as david_api
+import scripts.config as config
+import scripts.file_utils as fu
+
+# Images are stored on disk named by the sha256 of their content so the same image
+# at different urls is only stored once. The index maps each url to its content hash
+# plus what we need to revalidate it (ETag/Last-Modified) and when it was last used
+cache_dir = os.path.join(fu.get_home_dir(), '.david_cache', 'images')
+index_path = os.path.join(cache_dir, 'index.json')
+
+_config = config.read_config()
+# Size budget in bytes, least recently used images are evicted past this
+max_size = int(_config['image_cache_size'] * 1024 * 1024)
+# How long an image is used without asking the server if it has changed
+max_age = _config['image_cache_max_age']
+
+# Images are fetched from background threads so the index needs a lock
+_lock = threading.Lock()
+_index = None
+# Whether the index has changed since it was last written
+_index_dirty = False
+
+def _load_index():
+    """Load the index from disk the first time it's needed"""
+    global _index
+    if _index is not None:
+        return _index
+    try:
+        with open(index_path, 'r') as f:
+            _index = json.load(f)
+    except (OSError, ValueError):
+        _index = {}
+    return _index
+
+def _blob_path(content_hash):
+    """Where the image with the given hash is stored"""
+    return os.path.join(cache_dir, content_hash)
+
+def _read_blob(content_hash):
+    """Read an image from disk, None if it has gone missing"""
+    try:
+        with open(_blob_path(content_hash), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _write_blob(content, content_hash):
+    """Write an image to disk if we don't already have it"""
+    path = _blob_path(content_hash)
+    if os.path.exists(path):
+        return
+    # Write to a temporary file first so a crash can't leave half an image behind
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def _evict():
+    """Remove least recently used images until we're within the size budget"""
+    # Several urls can share an image, it was last used when any of them was
+    blobs = {}
+    for entry in _index.values():
+        used, _ = blobs.get(entry['hash'], (0, 0))
+        blobs[entry['hash']] = (max(used, entry['used']), entry['size'])
+    total = sum(size for _, size in blobs.values())
+
+    # Oldest first
+    for content_hash in sorted(blobs, key=lambda content_hash: blobs[content_hash][0]):
+        if total <= max_size:
+            break
+        for url in [url for url, entry in _index.items() if entry['hash'] == content_hash]:
+            del _index[url]
+        try:
+            os.remove(_blob_path(content_hash))
+        except OSError:
+            pass
+        total -= blobs[content_hash][1]
+
+def save():
+    """Write the index to disk if it has changed"""
+    global _index_dirty
+    with _lock:
+        if _index is None or not _index_dirty:
+            return
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{index_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(_index, f)
+            os.replace(tmp_path, index_path)
+            _index_dirty = False
+        except OSError as e:
+            logging.exception(e)
+
+def _store(url, response):
+    """Put a downloaded image in the cache"""
+    global _index_dirty
+    content = response.content
+    content_hash = hashlib.sha256(content).hexdigest()
+    with _lock:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_blob(content, content_hash)
+        now = time()
+        _load_index()[url] = {
+            'hash': content_hash,
+            'size': len(content),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'checked': now,
+            'used': now,
+        }
+        _evict()
+        _index_dirty = True
+    save()
+
+def get(url):
+    """Get the bytes of an image, from disk if we have it and from the server if not
+    Returns None if the image can't be fetched"""
+    global _index_dirty
+    if not url:
+        return None
+
+    with _lock:
+        entry = _load_index().get(url)
+        content = _read_blob(entry['hash']) if entry is not None else None
+        if entry is not None and content is None:
+            # Someone has been deleting files
+            del _index[url]
+            entry = None
+        if entry is not None:
+            entry['used'] = time()
+            _index_dirty = True
+            # Fresh enough to use without asking the server
+            if time() - entry['checked'] < max_age:
+                return content
+            entry = dict(entry)
+
+    # Ask the server if the image has changed since we got it
+    headers = {}
+    if entry is not None:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    try:
+        response = david_api.client.fetch(url, headers=headers)
+    except Exception as e:
+        logging.exception(e)
+        # Better a stale image than no image
+        return content
+
+    if response.status_code == 304 and entry is not None:
+        with _lock:
+            if url in _index:
+                _index[url]['checked'] = time()
+                _index_dirty = True
+        return content
+
+    if response.status_code != 200:
+        return content
+
+    _store(url, response)
+    return response.content
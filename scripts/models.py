@@ -0,0 +1,144 @@
+from sys import intern
+from datetime import datetime
+
+# Timestamps come from the API like 2024-01-16T04:57:01.998Z
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+# And this is how we show them
+DISPLAY_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+def parse_timestamp(timestamp):
+    """Parse an API timestamp, None if it's missing or in a format we don't know"""
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+def intern_name(name):
+    """Usernames turn up in every post, like and notification so share one copy of each"""
+    return intern(name) if isinstance(name, str) else name
+
+class Post():
+    """A post from the API
+    Built once when the post arrives so drawing it doesn't have to parse anything"""
+    __slots__ = ("id", "username", "content", "likes", "avi", "attached_image", "userid", "timestamp",
+                 "reply_to", "ncomments", "david_selection", "created", "display_time", "likers",
+                 "commenters", "commenters_loaded", "__weakref__")
+
+    def __init__(self, data):
+        self.set_fields(data)
+        # Who has replied, filled in from the replies route when we need it
+        # None with commenters_loaded set means we couldn't find out
+        self.commenters = None
+        self.commenters_loaded = False
+
+    def update(self, data):
+        """Update the post in place from a newer API response"""
+        ncomments = self.ncomments
+        self.set_fields(data)
+        # Who has replied is out of date if there are new replies
+        if self.ncomments != ncomments:
+            self.commenters = None
+            self.commenters_loaded = False
+
+    def set_fields(self, data):
+        """Fill in the post from an API response"""
+        self.id = data["id"]
+        self.username = intern_name(data["username"])
+        self.content = data["content"]
+        self.likes = data.get("likes", 0)
+        self.avi = data.get("avi", "")
+        self.attached_image = data.get("attached_image") or ""
+        self.userid = data.get("userid")
+        self.timestamp = data.get("timestamp")
+        self.reply_to = data.get("reply_to")
+        self.ncomments = data.get("ncomments", 0)
+        self.david_selection = data.get("david_selection", False)
+
+        # Derived fields
+        self.created = parse_timestamp(self.timestamp)
+        self.display_time = self.created.strftime(DISPLAY_FORMAT) if self.created is not None else ""
+        # Likers by lowercase name so checking if someone has liked it is a lookup, keeps the order they liked it in
+        self.likers = {}
+        for liker in data.get("liked_by") or []:
+            self.likers.setdefault(liker.lower(), intern_name(liker))
+
+    def is_liked_by(self, username):
+        """Check if a user has liked the post"""
+        return username.lower() in self.likers
+
+    def add_like(self, username):
+        """Record that a user has liked the post"""
+        if self.is_liked_by(username):
+            return
+        self.likers[username.lower()] = intern_name(username)
+        self.likes += 1
+
+    def get_likers(self, exclude=None):
+        """Names of everyone who has liked the post, optionally leaving someone out"""
+        exclude = exclude.lower() if exclude is not None else None
+        return [name for lowered, name in self.likers.items() if lowered != exclude]
+
+    def set_commenters(self, replies):
+        """Store who has replied from a replies response (None if the request failed)"""
+        if replies is None:
+            self.commenters = None
+        else:
+            # Remove duplicates, keeping the order they replied in so it's the same every time
+            self.commenters = list(dict.fromkeys(intern_name(reply["username"]) for reply in replies))
+        self.commenters_loaded = True
+
+    def to_json(self):
+        """The post as the API would send it"""
+        return {
+            "id": self.id,
+            "username": self.username,
+            "content": self.content,
+            "likes": self.likes,
+            "avi": self.avi,
+            "attached_image": self.attached_image,
+            "userid": self.userid,
+            "timestamp": self.timestamp,
+            "reply_to": self.reply_to,
+            "liked_by": list(self.likers.values()),
+            "ncomments": self.ncomments,
+            "david_selection": self.david_selection,
+        }
+
+class Notification():
+    """A notification from the API"""
+    __slots__ = ("id", "actor", "url", "snippet", "time", "type", "to_notify", "seen", "actors", "kind")
+
+    # Notifications sit in a feed alongside posts but are never David selections
+    david_selection = False
+
+    def __init__(self, data):
+        self.id = data["id"]
+        self.actor = data.get("actor") or ""
+        self.url = data.get("url") or ""
+        self.snippet = data.get("snippet") or ""
+        self.time = data.get("time")
+        self.type = data.get("type")
+        self.to_notify = data.get("to_notify")
+        self.seen = data.get("seen")
+
+        # Derived fields
+        # Several people liking or following gets joined into one notification separated by semicolons
+        self.actors = [intern_name(actor) for actor in self.actor.split(';')]
+        # The type comes through as a string
+        try:
+            self.kind = int(self.type)
+        except (TypeError, ValueError):
+            self.kind = None
+
+    def to_json(self):
+        """The notification as the API would send it"""
+        return {
+            "id": self.id,
+            "actor": self.actor,
+            "url": self.url,
+            "snippet": self.snippet,
+            "time": self.time,
+            "type": self.type,
+            "to_notify": self.to_notify,
+            "seen": self.seen,
+        }
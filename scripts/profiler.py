@@ -0,0 +1,124 @@
+import os
+import io
+import heapq
+import pstats
+import cProfile
+import tracemalloc
+from time import perf_counter
+
+# Frame timing for --profile
+# The main loop reports how long each update and draw took and which state it was in,
+# at exit we write a summary of the slowest frames and where the time went per state
+# --profile=cpu also runs cProfile on the main thread, --profile=memory runs tracemalloc
+# Everything here is a no-op until start() is called
+
+# How many of the slowest frames to keep
+SLOWEST_FRAMES = 20
+# How many lines of cProfile and tracemalloc output to put in the summary
+TOP_ENTRIES = 25
+
+_enabled = False
+_started = None
+_cpu = None
+# Totals per state name
+_states = {}
+# Min heap of the slowest frames as (total, time since start, state, update, draw)
+_slowest = []
+
+class StateTimes():
+    """Update and draw totals for one state"""
+    def __init__(self):
+        self.updates = 0
+        self.update_time = 0.0
+        self.max_update = 0.0
+        self.frames = 0
+        self.draw_time = 0.0
+        self.max_draw = 0.0
+
+def start(cpu=False, memory=False):
+    """Start profiling"""
+    global _enabled, _started, _cpu
+    _enabled = True
+    _started = perf_counter()
+    if cpu:
+        _cpu = cProfile.Profile()
+        _cpu.enable()
+    if memory:
+        tracemalloc.start(10)
+
+def enabled():
+    return _enabled
+
+def record(state, update_time, draw_time=None):
+    """Record one pass of the main loop, draw_time is None if nothing was drawn"""
+    if not _enabled:
+        return
+    name = type(state).__name__
+    times = _states.get(name)
+    if times is None:
+        times = _states[name] = StateTimes()
+    times.updates += 1
+    times.update_time += update_time
+    times.max_update = max(times.max_update, update_time)
+    if draw_time is None:
+        return
+    times.frames += 1
+    times.draw_time += draw_time
+    times.max_draw = max(times.max_draw, draw_time)
+
+    frame = (update_time + draw_time, perf_counter() - _started, name, update_time, draw_time)
+    if len(_slowest) < SLOWEST_FRAMES:
+        heapq.heappush(_slowest, frame)
+    elif frame > _slowest[0]:
+        heapq.heapreplace(_slowest, frame)
+
+def ms(seconds):
+    return f"{seconds * 1000:.2f}"
+
+def summary(extra=None):
+    """The profile as text, extra is a dict of other things worth knowing (e.g. cache sizes)"""
+    lines = [f"Profile of {perf_counter() - _started:.1f}s", ""]
+
+    lines.append("Time per state (ms)")
+    lines.append(f"{'state':>20} {'updates':>8} {'total':>10} {'max':>8} {'frames':>7} {'total':>10} {'max':>8} {'avg':>8}")
+    for name, times in sorted(_states.items(), key=lambda item: -(item[1].update_time + item[1].draw_time)):
+        average = times.draw_time / times.frames if times.frames else 0
+        lines.append(f"{name:>20} {times.updates:>8} {ms(times.update_time):>10} {ms(times.max_update):>8} "
+                     f"{times.frames:>7} {ms(times.draw_time):>10} {ms(times.max_draw):>8} {ms(average):>8}")
+
+    lines += ["", "Slowest frames (ms)"]
+    lines.append(f"{'at (s)':>8} {'state':>20} {'update':>8} {'draw':>8} {'total':>8}")
+    for total, at, name, update_time, draw_time in sorted(_slowest, reverse=True):
+        lines.append(f"{at:>8.2f} {name:>20} {ms(update_time):>8} {ms(draw_time):>8} {ms(total):>8}")
+
+    if extra:
+        lines += ["", "Other"]
+        lines += [f"{key}: {value}" for key, value in extra.items()]
+
+    if _cpu is not None:
+        _cpu.disable()
+        stream = io.StringIO()
+        pstats.Stats(_cpu, stream=stream).sort_stats("cumulative").print_stats(TOP_ENTRIES)
+        lines += ["", "cProfile (main thread, by cumulative time)", stream.getvalue().strip()]
+
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        lines += ["", f"Allocations (current {current / 1024 / 1024:.1f}MB, peak {peak / 1024 / 1024:.1f}MB), top sites"]
+        for stat in snapshot.statistics("lineno")[:TOP_ENTRIES]:
+            lines.append(f"{stat.size / 1024:>10.1f}KB {stat.count:>8} blocks  {stat.traceback[0]}")
+
+    return "\n".join(lines) + "\n"
+
+def write_summary(path, extra=None):
+    """Write the summary to a file, the cProfile stats go next to it for pstats/snakeviz"""
+    if not _enabled:
+        return None
+    with open(path, "w") as f:
+        f.write(summary(extra))
+    if _cpu is not None:
+        _cpu.dump_stats(os.path.splitext(path)[0] + ".prof")
+    return path
@@ -0,0 +1,84 @@
+import curses
+
+class Panel():
+    """A curses window owned by a component
+    The component draws into it when its content changes and marks it dirty,
+    and it only gets copied to the screen when it is dirty"""
+    def __init__(self):
+        self.window = None
+        self.geometry = None
+        self.dirty = True
+
+    def place(self, height, width, y, x):
+        """Put the window at the given position, (re)creating it if it has moved
+        Returns: True if the window is new and needs drawing into"""
+        height = max(1, height)
+        width = max(1, width)
+        geometry = (height, width, max(0, y), max(0, x))
+        if geometry == self.geometry and self.window is not None:
+            return False
+
+        self.window = curses.newwin(*geometry)
+        self.geometry = geometry
+        self.dirty = True
+        return True
+
+    def mark_dirty(self):
+        """The window content has changed"""
+        self.dirty = True
+
+    def flush(self, force=False):
+        """Queue the window for the next doupdate if it has changed
+        Returns: True if anything was queued"""
+        if self.window is None:
+            return False
+        if force:
+            # Whatever is underneath has been redrawn so we need to go back on top
+            self.window.touchwin()
+        elif not self.dirty:
+            return False
+
+        self.window.noutrefresh()
+        self.dirty = False
+        return True
+
+def get_panels(state):
+    """Panels of all the state's components, in the order they should be drawn"""
+    return [component.panel for component in state.get_components() if getattr(component, "panel", None) is not None]
+
+def any_dirty(state):
+    """Check if any of the state's panels need flushing"""
+    return any(panel.dirty for panel in get_panels(state))
+
+class Renderer():
+    """Gets states onto the screen while touching as little of the terminal as possible
+    The state's body is drawn straight onto stdscr, components (ticker, menu, images)
+    each have their own window on top of it"""
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+
+    def render(self, state, full=False):
+        """Draw a frame
+        A full frame redraws the body and every component, otherwise only dirty components are flushed"""
+        if full:
+            # Erase rather than clear so curses only sends the cells that actually changed
+            self.stdscr.erase()
+            self.stdscr.move(0, 0)
+            # Curses always fails when drawing, so we need to catch the exception
+            try:
+                state.draw()
+            except Exception as e:
+                # Only enable this if you REALLY NEED TO DEBUG
+                # Because otherwise it will print a billion errors if you try resize the window
+                # logging.exception(e)
+                pass
+            self.stdscr.noutrefresh()
+
+        flushed = full
+        for panel in get_panels(state):
+            flushed = panel.flush(force=full) or flushed
+
+        # Nothing changed means nothing gets written to the terminal
+        if flushed:
+            curses.doupdate()
+        return flushed
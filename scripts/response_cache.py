@@ -0,0 +1,90 @@
+import threading
+from copy import deepcopy
+from time import monotonic
+
+# Responses from query_api kept in memory for a while so building a state doesn't have to
+# ask the server for things it told us a moment ago (profiles, avatars, who follows who...)
+# Only routes with a TTL are cached, anything that changes what they return throws them away
+
+# Seconds a response is good for, per route
+TTLS = {
+    'version': 3600,
+    'user-list': 300,
+    'avi-url': 600,
+    'profile': 60,
+    'bootlickers': 120,
+    'bootlicking': 120,
+    'get-ticker-text': 30,
+    'get-cat-pets': 10,
+}
+
+# Routes that change things on the server and the cached routes they make stale
+# Profiles include the user's posts so anything that changes a post affects them
+INVALIDATES = {
+    'like-post': ['profile'],
+    'new-post': ['profile'],
+    'delete-post': ['profile'],
+    'public-set-ticker-text': ['get-ticker-text'],
+    'pet-cat': ['get-cat-pets'],
+}
+
+# query_api runs on worker threads
+_lock = threading.Lock()
+# (route, params, session) -> (expiry time, data)
+_entries = {}
+# Bumped every time a route is invalidated so a request that was already in flight
+# when we wrote something doesn't put the old data back
+_generations = {}
+
+def make_key(route, params, cookies):
+    """Everything that decides what a route returns, the session because some routes depend on who's asking"""
+    session = tuple(sorted(cookies.items())) if cookies else None
+    return (route, tuple(params.items()), session)
+
+def cacheable(route):
+    return route in TTLS
+
+def generation(route):
+    """Call before making a request and pass it to put()"""
+    return _generations.get(route, 0)
+
+def get(key):
+    """Get a copy of a cached response, None if we don't have one or it's too old"""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        expires, data = entry
+        if monotonic() >= expires:
+            del _entries[key]
+            return None
+    # Copied so nobody can change the cached one
+    return deepcopy(data)
+
+def put(key, data, generation):
+    """Cache a response, ignored if it failed or the route was invalidated while it was in flight"""
+    route = key[0]
+    if data is None:
+        return
+    with _lock:
+        if _generations.get(route, 0) != generation:
+            return
+        _entries[key] = (monotonic() + TTLS[route], deepcopy(data))
+
+def invalidate(route):
+    """Forget everything a route that changes things on the server has made stale"""
+    stale = INVALIDATES.get(route)
+    if stale is None:
+        return
+    with _lock:
+        for stale_route in stale:
+            _generations[stale_route] = _generations.get(stale_route, 0) + 1
+        for key in [key for key in _entries if key[0] in stale]:
+            del _entries[key]
+
+def clear():
+    """Forget everything"""
+    with _lock:
+        for route in TTLS:
+            _generations[route] = _generations.get(route, 0) + 1
+        _entries.clear()
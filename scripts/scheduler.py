@@ -0,0 +1,117 @@
+import sys
+import select
+import curses
+from time import monotonic
+import scripts.executor as executor
+import scripts.render as render
+
+# How often to check on background jobs when they can't wake us up (Windows)
+POLL_INTERVAL = 0.05
+# Longest we'll sleep for with nothing to do
+# Resizing the terminal doesn't wake select (ncurses handles SIGWINCH and select carries on),
+# curses only tells us with KEY_RESIZE the next time we read a key, so check a few times a second
+MAX_SLEEP = 0.25
+
+# Keys the menu handles by redrawing its own window, everything else redraws the whole state
+NAVIGATION_KEYS = (curses.KEY_LEFT, curses.KEY_RIGHT, curses.KEY_UP, curses.KEY_DOWN)
+
+def earliest(a, b):
+    """The sooner of two timeouts where None means wait forever"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+class Scheduler():
+    """Paces the main loop
+    Sleeps until there's input, an animation deadline or finished background work
+    and only lets a frame be drawn when something has changed (at most once per refresh_rate)
+    dirty means the whole state needs redrawing, components track their own changes"""
+    def __init__(self, stdscr, refresh_rate):
+        self.stdscr = stdscr
+        # Minimum time between frames, acts as a frame cap
+        self.refresh_rate = max(refresh_rate or 0, 0)
+        self.last_draw = 0
+        # Start dirty so the first frame gets drawn
+        self.dirty = True
+        # If we just read a key there may be more waiting so don't sleep
+        self.busy = True
+
+        try:
+            self.stdin_fd = sys.stdin.fileno()
+        except Exception:
+            self.stdin_fd = None
+        # We can only sleep on stdin and the executor together if select works on both
+        self.can_select = self.stdin_fd is not None and executor.wake_fd() is not None
+
+    def mark_dirty(self):
+        """Something changed so a frame needs drawing"""
+        self.dirty = True
+
+    def get_timeout(self, state):
+        """Work out how long we can sleep for, at most MAX_SLEEP"""
+        if self.busy:
+            return 0
+
+        # Countdowns and pending state work
+        timeout = state.next_deadline()
+
+        # Component animations (e.g. the ticker scrolling)
+        for component in state.get_components():
+            if hasattr(component, "next_deadline"):
+                timeout = earliest(timeout, component.next_deadline())
+
+        if timeout is not None:
+            timeout = max(0, timeout)
+
+        # A frame held back by the frame cap is due once the cap allows
+        if self.dirty or render.any_dirty(state):
+            timeout = earliest(timeout, max(0, self.last_draw + self.refresh_rate - monotonic()))
+
+        # Without a wake pipe we have to poll for finished background work
+        if not self.can_select and executor.pending() > 0:
+            timeout = earliest(timeout, POLL_INTERVAL)
+
+        return earliest(timeout, MAX_SLEEP)
+
+    def wait(self, state):
+        """Sleep until there is something to do"""
+        timeout = self.get_timeout(state)
+        deadline = state.next_deadline()
+        start = monotonic()
+
+        if self.can_select:
+            # Input is read without blocking because we've already waited for it here
+            self.stdscr.nodelay(True)
+            select.select([self.stdin_fd, executor.wake_fd()], [], [], timeout)
+        else:
+            # Otherwise let getch do the waiting
+            self.stdscr.timeout(-1 if timeout is None else round(timeout * 1000))
+
+        # Finished background work may have changed what's on screen
+        if executor.drain_wakeups():
+            self.dirty = True
+
+        # Reached a state deadline, component deadlines are handled by the components themselves
+        if deadline is not None and monotonic() - start >= deadline:
+            self.dirty = True
+
+    def handle_input(self, state):
+        """Check whether the state got a key press this update"""
+        menu = getattr(state, "menu", None)
+        key = getattr(menu, "last_key", -1)
+        self.busy = key != -1
+        if self.busy and key not in NAVIGATION_KEYS:
+            self.dirty = True
+
+    def frame_due(self, state):
+        """Check if a frame should be drawn now"""
+        if not self.dirty and not render.any_dirty(state):
+            return False
+        return monotonic() - self.last_draw >= self.refresh_rate
+
+    def frame_drawn(self):
+        """Record that a frame has been drawn"""
+        self.last_draw = monotonic()
+        self.dirty = False
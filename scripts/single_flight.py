@@ -0,0 +1,66 @@
+import threading
+from copy import deepcopy
+
+# Identical reads that overlap share one request, e.g. fetching a post's replies for the
+# commenter list while its reply feed asks for exactly the same thing
+# The first caller makes the request and everyone else who turns up before it's done waits
+# for its result, once it's finished the next call goes to the server (or the response cache)
+
+# Routes that change something on the server, these are never shared
+WRITES = {'login', 'new-post', 'delete-post', 'like-post', 'public-set-ticker-text', 'pet-cat'}
+
+_lock = threading.Lock()
+# Key -> Flight for requests that haven't finished
+_in_flight = {}
+
+class Flight():
+    """One request that other callers can wait for"""
+    def __init__(self):
+        self.finished = threading.Event()
+        self.data = None
+        self.error = None
+        # How many callers are waiting on it
+        self.joined = 0
+
+def shareable(route):
+    return route not in WRITES
+
+def run(key, function):
+    """Get the result of function(), or of the identical call already in flight
+    Returns: (data, whether it was shared)"""
+    with _lock:
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[key] = Flight()
+        else:
+            flight.joined += 1
+
+    if not leader:
+        flight.finished.wait()
+        if flight.error is not None:
+            raise flight.error
+        # Everyone gets their own copy so nobody can change anyone else's
+        return deepcopy(flight.data), True
+
+    data = None
+    try:
+        data = function()
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            # A write may have already sent newer callers elsewhere
+            if _in_flight.get(key) is flight:
+                del _in_flight[key]
+            # Nobody else can join now, if anyone did they copy from one we don't hand out
+            if flight.joined:
+                flight.data = deepcopy(data)
+        flight.finished.set()
+    return data, False
+
+def wrote():
+    """Something changed on the server, calls from now on shouldn't join a request that started before"""
+    with _lock:
+        _in_flight.clear()
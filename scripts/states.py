@@ -1,6 +1,5 @@
 import curses
 import os
-import requests
 import csv
 from random import choice
 from math import floor
@@ -8,8 +7,15 @@ from io import BytesIO
 from PIL import Image
 from enum import Enum
 from datetime import datetime
+from time import monotonic
 from scripts.ds_components import Menu, Ticker, AsciiImage, Feed, Profile
 import scripts.api_routes as david_api
+import scripts.executor as executor
+import scripts.image_cache as image_cache
+import scripts.store as store
+import scripts.disk_cache as disk_cache
+import scripts.api_metrics as api_metrics
+import scripts.tracer as tracer
 from scripts.colours import ColourConstants
 import scripts.secrets as secrets
 import scripts.config as config
@@ -29,6 +35,9 @@ state_history = []
 _config = config.read_config()
 preserve_feed_position = _config['preserve_feed_position']
 
+# How many posts either side of the current one to fetch replies and images for in the background
+prefetch_depth = _config['prefetch_depth']
+
 # Bootlicking cache so we don't have to make a request every time
 bootlicking_cache = None
 
@@ -83,6 +92,18 @@ class State():
 
         return None
 
+    def next_deadline(self):
+        """Seconds until the state next needs updating without any input
+        None means it can wait until something happens, 0 means it has work to do right now"""
+        # One time functions should happen straight away
+        if self.callback is not None:
+            return 0
+        return None
+
+    def get_components(self):
+        """Components that draw into their own windows, in the order they go on screen"""
+        return [self.menu]
+
     def draw(self):
         """Draw the state"""
         # Draw the menu
@@ -97,6 +118,7 @@ class State():
         """Advance the state"""
         # Add the current state to the history
         state_history.append(self)
+        tracer.instant("advance_state", "state", {"from": type(self).__name__, "to": type(state).__name__})
 
         # Set the callback
         if callback is not None:
@@ -111,6 +133,7 @@ class State():
         self.cleanup()
         # Now revert to the previous state
         previous_state = state_history.pop()
+        tracer.instant("regress_state", "state", {"from": type(self).__name__, "to": type(previous_state).__name__})
         # Set the callback
         if callback is not None:
             previous_state.callback = callback
@@ -129,9 +152,9 @@ class StateMain(State):
         # Get the path to the david ascii art - first go up a directory, then go into assets
         self.david_logo = os.path.join(os.path.dirname(os.path.dirname(__file__)), "assets/david.png")
 
-        # Get the version
-        self.version = david_api.query_api("version")
-        self.version = self.version['version']
+        # Get the version in the background, showing the one we saved last time until it arrives
+        self.version_request = david_api.query_api_async("version")
+        self.version = disk_cache.get_meta("version") or "..."
 
         # Session
         self.session = session
@@ -144,7 +167,7 @@ class StateMain(State):
         self.david_ascii = None
 
         # Initialise the menu
-        menu_items = ["Bootlicker Feed", "Global Feed", "View Notifications", "New Post", "Pet the Cat", "Update Ticker", "View Profile", "Exit", ]
+        menu_items = ["Bootlicker Feed", "Global Feed", "View Notifications", "New Post", "Pet the Cat", "Update Ticker", "View Profile", "Stats", "Exit", ]
         menu_states = [
                 {
                     'type': 'state_change',
@@ -188,6 +211,12 @@ class StateMain(State):
                     'state': StateProfile,
                     'args': (self.stdscr, self.session, self.logger, secrets.get_username())
                 },
+                {
+                    'type': 'state_change',
+                    'function': self.advance_state,
+                    'state': StateStats,
+                    'args': (self.stdscr, self.session, self.logger)
+                },
                 {
                     'type': 'state_change',
                     'function': self.advance_state,
@@ -209,9 +238,20 @@ class StateMain(State):
         # Update the ticker
         self.ticker.update()
 
+        if self.version_request is not None and self.version_request.done():
+            response = executor.result(self.version_request)
+            self.version_request = None
+            if response is not None:
+                self.version = response['version']
+                disk_cache.set_meta("version", self.version)
+
         # Call the parent update function
         return super().update()
 
+    def get_components(self):
+        """Components with their own windows"""
+        return [self.ticker, self.david_ascii, self.menu]
+
     def update_ascii(self):
         """Update ascii to fit the terminal"""
         # We need to generate the ascii if it doesn't exist
@@ -250,7 +290,7 @@ class StateMain(State):
         self.stdscr.addstr("\n")
         welcome_message = f"Welcome to David Social version {self.version}!"
         # Centre the welcome message
-        _, max_width = curses.initscr().getmaxyx()
+        _, max_width = self.stdscr.getmaxyx()
         max_width -= 1
         centre = round((max_width - len(welcome_message))/2)
         self.stdscr.addstr(" "*centre + welcome_message + "\n")
@@ -265,7 +305,7 @@ class StateMain(State):
         try:
             self.david_ascii.draw()
         except:
-            max_height, _ = curses.initscr().getmaxyx()
+            max_height, _ = self.stdscr.getmaxyx()
             line_breaks = floor(max_height / 2)
             h_offset = floor((max_width - len("¯\(°_o)/¯")) / 2)
             default_david = "¯\(°_o)/¯"
@@ -297,6 +337,10 @@ class StateExit(State):
 
         super().update()
 
+    def next_deadline(self):
+        """Wake up when the countdown runs out"""
+        return self.countdown - (datetime.now() - self.t).total_seconds()
+
     def draw(self):
         """Draw the state"""
         self.stdscr.addstr("Thanks for using David Social!\n")
@@ -328,11 +372,21 @@ class StateFeed(State):
         self.parent = parent
 
         self.parent_content = None
+        self.parent_request = None
 
         # Make a request to the api to get the parent post from ID
+        # This happens in the background so show a placeholder in the meantime
+        # We've usually seen the parent already, in which case there's no need to ask for it
         if self.parent is not None:
-            response = david_api.query_api("get-post", [self.parent], self.session.cookies)
-            self.parent_content = f"@{response['username']}: {response['content']}"
+            parent_post = store.get_post(self.parent)
+            if parent_post is not None:
+                self.parent_content = f"@{parent_post.username}: {parent_post.content}"
+            else:
+                self.parent_request = david_api.query_api_async("get-post", [self.parent], self.session.cookies)
+                self.parent_content = "@David: Loading..."
+
+        # Pending replies lookups, post id -> (post, future)
+        self.replies_requests = {}
 
         # Set up the feed
         self.feed_type = feed_type
@@ -377,19 +431,57 @@ class StateFeed(State):
         # Some miscellaneous variables
         self.have_liked = self.post_is_liked()
         self.attached_image = ""
+        # Attached images we've already started downloading ahead of time
+        self.prefetched_images = set()
 
         # If callback is an integer and this is a reply thread then we call jump to post with the callback as the post ID
         # The id is parsed from json so it is a string
+        # If the feed is still loading we hold on to it and jump once the posts arrive
+        self.jump_target = None
         if isinstance(self.callback, str) and self.feed_type == "Reply":
-            self.logger.info(f"Jumping to post {self.callback}")
-            temp = self.jump_to_post(self.callback)
+            self.jump_target = self.callback
             self.callback = None
-            self.logger.info(f"Jumped to post {self.current_post}")
+            if not self.feed.is_loading():
+                self.apply_jump()
 
         # Now update the menu
         self.update_menu()
 
+    def apply_jump(self):
+        """Jump to the post we were asked to jump to on creation"""
+        self.logger.info(f"Jumping to post {self.jump_target}")
+        self.jump_to_post(self.jump_target)
+        self.jump_target = None
+        self.logger.info(f"Jumped to post {self.current_post}")
+
+    def poll_requests(self):
+        """Check on any background requests and fill in their results"""
+        # Feed has arrived (or more posts have been loaded)
+        if self.feed.poll():
+            self.current_post = self.feed.get_post(self.feed.post_index)
+            if self.jump_target is not None:
+                self.apply_jump()
+            self.update_menu()
+
+        # Parent post for reply threads
+        if self.parent_request is not None and self.parent_request.done():
+            response = executor.result(self.parent_request)
+            self.parent_request = None
+            if response is None:
+                self.parent_content = "@David: Couldn't load the post being replied to"
+            else:
+                self.parent_content = f"@{response['username']}: {response['content']}"
+
+        # Replies lookups for the commenters list
+        for post_id, (post, future) in list(self.replies_requests.items()):
+            if future.done():
+                del self.replies_requests[post_id]
+                post.set_commenters(executor.result(future))
+
     def update(self):
+        self.poll_requests()
+        self.prefetch()
+
         if self.regress:
             # Set the callback to update_post
             par_state = state_history[-1]
@@ -402,6 +494,12 @@ class StateFeed(State):
 
         return super().update()
 
+    def next_deadline(self):
+        """Regressing has to happen straight away"""
+        if self.regress:
+            return 0
+        return super().next_deadline()
+
     def setup_menu_functions(self):
         """Defines functions used by the menu"""
         self.next_post_func = {
@@ -433,13 +531,13 @@ class StateFeed(State):
             'type': 'state_change',
             'function': self.advance_state,
             'state': StateFeed,
-            'args': (self.stdscr, self.session, self.logger, "Reply", self.current_post['id'], self.current_post['id'])
+            'args': (self.stdscr, self.session, self.logger, "Reply", self.current_post.id, self.current_post.id)
         }
         self.reply_to_post_func = {
             'type': 'state_change',
             'function': self.advance_state,
             'state': StateTextEntry,
-            'args': (self.stdscr, self.session, self.logger, TextEntryType.REPLY, self.current_post['id'], f"@{self.current_post['username']} {self.current_post['content']}")
+            'args': (self.stdscr, self.session, self.logger, TextEntryType.REPLY, self.current_post.id, f"@{self.current_post.username} {self.current_post.content}")
         }
         self.delete_post_func = {
             'type': 'function',
@@ -457,14 +555,14 @@ class StateFeed(State):
         """Update any menu functions that need updating"""
         # Update the reply function to reply to the parent post, not the reply
         # Define the parent-  we inherit it to prevent replying to replies
-        parent = self.current_post['id'] if self.parent is None else self.parent
-        self.reply_to_post_func['args'] = (self.stdscr, self.session, self.logger, TextEntryType.REPLY, parent, f"@{self.current_post['username']} {self.current_post['content']}")
+        parent = self.current_post.id if self.parent is None else self.parent
+        self.reply_to_post_func['args'] = (self.stdscr, self.session, self.logger, TextEntryType.REPLY, parent, f"@{self.current_post.username} {self.current_post.content}")
 
         # Update the view replies function to view the replies to the current post
-        self.view_replies_func['args'] = (self.stdscr, self.session, self.logger, "Reply", self.current_post['id'], self.current_post['id'])
+        self.view_replies_func['args'] = (self.stdscr, self.session, self.logger, "Reply", self.current_post.id, self.current_post.id)
 
         # Update view_profile function to include username argument
-        self.view_profile_func['args'] = (self.stdscr, self.session, self.logger, self.current_post['username'])
+        self.view_profile_func['args'] = (self.stdscr, self.session, self.logger, self.current_post.username)
 
         # If we're in a reply thread we add a callback to update the post to the back function
         # Check the class name because it keeps trying to add a callback to StateMain which doesn't have an update_post function so it crashes
@@ -494,6 +592,12 @@ class StateFeed(State):
         # Update menu functions
         self.update_menu_functions()
 
+        # While the feed is loading the only thing we can do is go back
+        if self.feed.is_loading():
+            self.menu.update_menu("Back", self.back_func, self.menu.get_num_items())
+            self.menu.selection = 0
+            return None
+
         # Now we can add the items back in
         # If we are not on index 0 of the feed then prepend with "Previous post"
         if self.feed.post_index != 0:
@@ -509,17 +613,17 @@ class StateFeed(State):
 
         # If there are replies then append with "View Replies"
         # But only if we are NOT on a reply thread
-        if self.current_post['ncomments'] > 0 and self.parent is None:
+        if self.current_post.ncomments > 0 and self.parent is None:
             self.menu.update_menu("View Replies", self.view_replies_func, self.menu.get_num_items())
 
-        if self.current_post['attached_image'] != "":
+        if self.current_post.attached_image != "":
             self.menu.update_menu("View Attached Image", self.view_image_func, self.menu.get_num_items())
 
         # Add a reply option indiscriminately
         self.menu.update_menu("Reply", self.reply_to_post_func, self.menu.get_num_items())
 
         # If it is our own post we can delete it
-        if self.current_post['username'].lower() == self.username.lower():
+        if self.current_post.username.lower() == self.username.lower():
             self.menu.update_menu("Delete", self.delete_post_func, self.menu.get_num_items())
         elif self.feed_type != "User":
             # Otherwise we can view their profile (except don't add this if we are viewing a user's profile otherwise we can get really deep into viewing profiles from profiles)
@@ -566,7 +670,7 @@ class StateFeed(State):
 
         # Then update the menu and clear the attached image
         self.update_menu()
-        self.attached_image = ""
+        self.clear_attached_image()
 
         return None
 
@@ -576,10 +680,14 @@ class StateFeed(State):
         self.feed.post_index += 1
         self.current_post = self.feed.get_post(self.feed.post_index)
 
+        # If we've hit the end of the feed start loading more in the background
+        if self.feed.post_index == len(self.feed.posts) - 1:
+            self.feed.load_more_posts()
+
         self.update_menu()
 
         # Clear attached image
-        self.attached_image = ""
+        self.clear_attached_image()
 
         return None
 
@@ -595,26 +703,24 @@ class StateFeed(State):
         self.update_menu()
 
         # Clear attached image
-        self.attached_image = ""
+        self.clear_attached_image()
 
         return None
 
     def post_is_liked(self):
         """Check if the post is liked"""
         # Check if we have liked the post
-        if self.username.lower() in [liker.lower() for liker in self.current_post['liked_by']]:
-            return True
-        else:
-            return False
+        return self.current_post.is_liked_by(self.username)
 
     def like_post(self):
         """Likes the post"""
-        response = david_api.query_api("like-post", [self.current_post['id']], self.session.cookies)
+        response = david_api.query_api("like-post", [self.current_post.id], self.session.cookies)
         if response is None:
             return None
 
         # Update feed object
-        self.feed.posts[self.feed.post_index]['liked_by'].append(self.username)
+        self.feed.get_post(self.feed.post_index).add_like(self.username)
+        self.feed.save()
 
         self.update_menu()
         return None
@@ -622,7 +728,7 @@ class StateFeed(State):
     def update_post(self):
         """Updates the current post"""
         try:
-            self.logger.info(f"Updating post {self.current_post['id']}")
+            self.logger.info(f"Updating post {self.current_post.id}")
             self.current_post = self.feed.update_post(self.feed.post_index)
             # Update the menu too
             self.update_menu()
@@ -636,21 +742,24 @@ class StateFeed(State):
 
     def delete_post(self):
         """Call API to delete the post and remove from the feed"""
-        response = david_api.query_api("delete-post", [self.current_post['id']], self.session.cookies)
+        response = david_api.query_api("delete-post", [self.current_post.id], self.session.cookies)
 
         if response is not None:
-            self.feed.delete_post(self.feed.post_index)
-            self.update_post()
+            # Takes it out of every feed it's in, including this one
+            store.delete_post(self.current_post.id)
+            self.current_post = self.feed.get_post(self.feed.post_index)
+            self.update_menu()
+            self.clear_attached_image()
 
     def view_image(self):
         """View the attached image"""
-        # Request the image
-        r = requests.get(self.current_post['attached_image'])
-        if r.status_code != 200:
+        # Get the image, usually from the cache since we've already drawn it
+        content = image_cache.get(self.current_post.attached_image)
+        if content is None:
             return None
 
         # Open and show image
-        img = Image.open(BytesIO(r.content))
+        img = Image.open(BytesIO(content))
         img.show()
 
     def draw_post(self):
@@ -660,7 +769,7 @@ class StateFeed(State):
         lite_line  = "." * (curses.COLS - 1) + "\n"
 
         # If this is a David Selection say so
-        if self.current_post['david_selection']:
+        if self.current_post.david_selection:
             self.stdscr.addstr("*:･ﾟ✧*:･ﾟ✧ David Selection\n", self.colours.YELLOW_BLACK | curses.A_BLINK)
             self.stdscr.addstr(linebreak)
 
@@ -672,10 +781,9 @@ class StateFeed(State):
             self.stdscr.addstr(linebreak)
 
         # Username and timestamp
-        timestamp = self.current_post['timestamp']
-        timestamp = datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
-        date_time = timestamp.strftime("%d/%m/%Y %H:%M:%S")
-        self.stdscr.addstr(f"@{self.current_post['username']} ", self.colours.YELLOW_BLACK)
+        # Formatted when the post arrived
+        date_time = self.current_post.display_time
+        self.stdscr.addstr(f"@{self.current_post.username} ", self.colours.YELLOW_BLACK)
         self.stdscr.addstr("posted at ")
         self.stdscr.addstr(f"{date_time}\n", self.colours.GREEN_BLACK)
         # Removing this line break cause it looks weird
@@ -684,18 +792,16 @@ class StateFeed(State):
 
         # Post content
         # Skip if blank
-        body = self.current_post['content']
+        body = self.current_post.content
         if body.strip() != "":
-            self.stdscr.addstr(f"{self.current_post['content']}\n")
+            self.stdscr.addstr(f"{self.current_post.content}\n")
             self.stdscr.addstr(lite_line)
 
         # Likes and comments
-        likes = self.current_post['liked_by'].copy()
         # We put our name at the beginning in yellow to signify we have liked it
-        if len(likes) > 0 and self.have_liked:
-            # Find our position in the list of likers and remove it
-            lowered_likes = [liker.lower() for liker in likes]
-            del likes[lowered_likes.index(self.username.lower())]
+        if self.have_liked:
+            # Everyone else who has liked it
+            likes = self.current_post.get_likers(exclude=self.username)
 
             likers = ", ".join(likes)
             self.stdscr.addstr("Liked by: ", self.colours.GREEN_BLACK)
@@ -704,70 +810,112 @@ class StateFeed(State):
             if len(likes) > 0:
                 self.stdscr.addstr(", ")
             self.stdscr.addstr(likers + "\n")
-        elif len(likes) > 0 and not self.have_liked:
-            likers = ", ".join(likes)
+        elif len(self.current_post.likers) > 0:
+            likers = ", ".join(self.current_post.get_likers())
             self.stdscr.addstr("Liked by: ", self.colours.GREEN_BLACK)
             self.stdscr.addstr(likers + "\n")
         else:
             likers = "0 likes, you should be the first! :3"
             self.stdscr.addstr(likers + "\n")
 
-        # Cleanup
-        del likes
-
         self.stdscr.addstr(lite_line)
 
         # Commenters
-        if self.current_post['ncomments'] > 0:
+        if self.current_post.ncomments > 0:
             # We don't get who has left a comment from the feed so we have to query the api
-            # (might be slow)
-            if 'commenters' not in self.current_post:
-                response = david_api.query_api("replies", [self.current_post['id']], self.session.cookies)
-                # Cache the replies in the feed cache
-                # Create a feed object first
-                if self.current_post['id'] not in feeds:
-                    feeds[self.current_post['id']] = Feed(self.session, "Reply", self.current_post['id'])
-
-                if response is None:
-                    self.current_post['commenters'] = None
-                else:
-                    self.current_post['commenters'] = [reply['username'] for reply in response]
-                    # Make it a set to remove duplicates
-                    self.current_post['commenters'] = list(set(self.current_post['commenters']))
+            # This happens in the background and we say we're loading until it arrives
+            if not self.current_post.commenters_loaded:
+                self.request_commenters()
+                commenters = f"{self.current_post.ncomments} replies (loading who replied...)"
             # Then we can join the list of commenters
-            if self.current_post['commenters'] is None:
-                self.current_post['commenters'] = f"{self.current_post['ncomments']} replies"
+            elif self.current_post.commenters is None:
+                commenters = f"{self.current_post.ncomments} replies"
             else:
                 try:
-                    num_commenters = len(self.current_post['commenters'])
+                    num_commenters = len(self.current_post.commenters)
                     if num_commenters > 1:
-                        commenters = ", ".join(self.current_post['commenters'][:-1])
+                        commenters = ", ".join(self.current_post.commenters[:-1])
                         commenters += " and "
-                        commenters += self.current_post['commenters'][-1]
+                        commenters += self.current_post.commenters[-1]
                         commenters += " have replied to this post"
                     else:
-                        commenters = self.current_post['commenters'][0]
+                        commenters = self.current_post.commenters[0]
                         commenters += " has replied to this post"
                 except Exception as e:
                     self.logger.exception(e)
-                    commenters = f"{self.current_post['ncomments']} replies"
+                    commenters = f"{self.current_post.ncomments} replies"
         else:
             commenters = "Nobody has replied to this post, you should be the first! :3"
         self.stdscr.addstr(commenters + "\n")
 
-        if self.current_post['attached_image'] != "":
+        if self.current_post.attached_image != "":
             self.stdscr.addstr(linebreak)
             rows = self.menu.get_rows()
 
             if self.attached_image == "":
-                self.attached_image = AsciiImage(self.stdscr, self.current_post['attached_image'], url=True, centre=True, dim_adjust=(0, rows + 1))
+                self.attached_image = AsciiImage(self.stdscr, self.current_post.attached_image, url=True, centre=True, dim_adjust=(0, rows + 1))
             else:
                 # Set the dim adjust to the current menu rows + 1
                 self.attached_image.set_dim_adjust((0, rows + 1))
                 # Update incase it needs resizing
                 self.attached_image.update()
-                # Then draw it
-                self.attached_image.draw()
+            # Then draw it
+            self.attached_image.draw()
+
+    def get_components(self):
+        """Components with their own windows"""
+        image = self.attached_image if self.attached_image != "" else None
+        return [image, self.menu]
+
+    def clear_attached_image(self):
+        """Throw away the attached image, cancelling it if it's still being rendered"""
+        if self.attached_image != "":
+            self.attached_image.close()
+        self.attached_image = ""
+
+    def request_commenters(self, post=None, make_feed=True):
+        """Start fetching the replies to a post (the current one by default) if we aren't already
+        make_feed also gets the reply feed ready, prefetching leaves that until the replies are opened"""
+        if post is None:
+            post = self.current_post
+        if post.id in self.replies_requests:
+            return
+
+        future = david_api.query_api_async("replies", [post.id], self.session.cookies)
+        self.replies_requests[post.id] = (post, future)
+
+        if not make_feed:
+            return
+
+        # Cache the replies in the feed cache
+        # Create a feed object first
+        if post.id not in feeds:
+            feeds[post.id] = Feed(self.session, "Reply", post.id)
+
+    def prefetch(self):
+        """Fetch replies and attached images for the posts either side of the current one
+        so they're ready by the time we get there. Nearest posts go first and we stop
+        if the background workers are already busy so we don't hold up anything more important"""
+        if self.feed.is_loading():
+            return
+        index = self.feed.post_index
+        for distance in range(1, prefetch_depth + 1):
+            for neighbour in (index + distance, index - distance):
+                if executor.saturated():
+                    return
+                if neighbour < 0 or neighbour >= len(self.feed.posts):
+                    continue
+                post = self.feed.get_post(neighbour)
+
+                if post.ncomments > 0 and not post.commenters_loaded:
+                    # Just the commenters, a feed each would load from disk on this thread and never go away
+                    self.request_commenters(post, make_feed=False)
+
+                # Images only need to be on disk, they're quick to render from there
+                image_url = post.attached_image
+                if image_url != "" and image_url not in self.prefetched_images:
+                    self.prefetched_images.add(image_url)
+                    executor.submit(image_cache.get, image_url)
 
     def draw(self):
         """Draw the state"""
@@ -781,6 +929,7 @@ class StateFeed(State):
         # Reset the feed index if desired
         if not preserve_feed_position:
             self.feed.post_index = 0
+        self.clear_attached_image()
         # Call the parent cleanup function
         super().cleanup()
 
@@ -830,28 +979,41 @@ class StatePetCat(State):
 
     def pet_cat(self):
         # We call the api again and get a new kaomoji
-        # Pet the cat
-        response = david_api.query_api("pet-cat", cookies=self.session.cookies)
+        # Petting happens in the background so the count says we're waiting until it comes back
+        self.catpets = "a who knows how many (petting...)"
+        self.pet_request = executor.submit(self.pet_and_count, self.session.cookies)
+
+        # Get a random kaomoji
+        self.cat_kaomoji = choice(self.cat_kaomoji_list)
+
+    def pet_and_count(self, cookies):
+        """Pet the cat and get the new number of catpets, runs in the background"""
+        response = david_api.query_api("pet-cat", cookies=cookies)
 
         if response is None:
             self.logger.error("pet-cat returned None")
 
         # Get number of catpets
-        self.catpets = david_api.query_api("get-cat-pets", cookies=self.session.cookies)
+        return david_api.query_api("get-cat-pets", cookies=cookies)
 
-        # Default to a string if we get none
-        if self.catpets is None:
-            self.catpets = "an unknown number of"
-        else:
-            self.catpets = self.catpets['pets']
+    def update(self):
+        """Update the state"""
+        # Check if the cat has been petted yet
+        if self.pet_request is not None and self.pet_request.done():
+            catpets = executor.result(self.pet_request)
+            self.pet_request = None
+            # Default to a string if we get none
+            if catpets is None:
+                self.catpets = "an unknown number of"
+            else:
+                self.catpets = catpets['pets']
 
-        # Get a random kaomoji
-        self.cat_kaomoji = choice(self.cat_kaomoji_list)
+        return super().update()
 
 
     def draw(self):
         # Get available space
-        rows, cols = curses.initscr().getmaxyx()
+        rows, cols = self.stdscr.getmaxyx()
         cols -= 1
         # Centre the number of catpets
         cat_pets_text = f"The cat has been petted {self.catpets} times!"
@@ -931,7 +1093,7 @@ class StateTextEntry(State):
     def blank_row(self, row):
         """Draws spaces across the row"""
         # Get avaiable space
-        _, cols = curses.initscr().getmaxyx()
+        _, cols = self.stdscr.getmaxyx()
         # Draw spaces
         self.stdscr.addstr(row, 0, " " * cols)
 
@@ -940,6 +1102,10 @@ class StateTextEntry(State):
         if self.callback is not None:
             return self.callback()
 
+    def next_deadline(self):
+        """The text entry loop lives in draw, so we only need waking to run the callback"""
+        return 0 if self.callback is not None else None
+
     def submit(self):
         try:
             # Poke the API with the text and additional params
@@ -987,7 +1153,7 @@ class StateTextEntry(State):
 
             # Blank the row
             if self.countdown <= 0:
-                y, _ = curses.initscr().getyx()
+                y, _ = self.stdscr.getyx()
                 self.blank_row(y)
                 # Set message to blank
                 self.feedback_message = ""
@@ -995,7 +1161,7 @@ class StateTextEntry(State):
     def draw(self):
         """Draw the state"""
         # Draw the prompt centred
-        rows, cols = curses.initscr().getmaxyx()
+        rows, cols = self.stdscr.getmaxyx()
         cols -= 1
         # Centre the prompt
         prompt_offset = round(0.5 * (cols - len(self.prompt)))
@@ -1014,7 +1180,7 @@ class StateTextEntry(State):
             self.stdscr.addstr(" ".join(self.post_body.split(' ')[1:]) + "\n")
 
         # Get the y position to draw at
-        y = curses.initscr().getyx()[0]
+        y = self.stdscr.getyx()[0]
 
         # Set cursor to VERY VISIBLE for text entry
         curses.curs_set(2)
@@ -1022,14 +1188,22 @@ class StateTextEntry(State):
         # Enter text gathering loop
         while self.callback is None:
             # Get updated available space
-            rows, cols = curses.initscr().getmaxyx()
+            rows, cols = self.stdscr.getmaxyx()
             cols -= 1
 
+            # Block waiting for a key, but wake up in time to clear any feedback message
+            if self.feedback_message != "":
+                self.stdscr.timeout(max(1, round(self.countdown * 1000)))
+            else:
+                self.stdscr.timeout(-1)
+
             # Get any key presses
             key = self.stdscr.getch()
 
             # If we press escape then we want to cancel
             if key == 27:
+                # Swallow the rest of an escape sequence without waiting for it
+                self.stdscr.timeout(0)
                 n = self.stdscr.getch()
                 self.callback = self.regress_state
                 break
@@ -1149,14 +1323,14 @@ class StateNotifications(StateFeed):
         # Get the context ID from the notification
         # The url is of the form /thread/id(?highlight=id) second part optional
         # Note that url may be blank
-        if self.current_post['url'] == "":
+        if self.current_post.url == "":
             # We go to the profile viewer state to view our new follower :D
-            if self.current_post['type'] == NotificationType.FOLLOW.value:
-                return StateProfile, (self.stdscr, self.session, self.logger, self.current_post['actor'].split(';')[0])
+            if self.current_post.kind == NotificationType.FOLLOW.value:
+                return StateProfile, (self.stdscr, self.session, self.logger, self.current_post.actors[0])
             else:
                 return None
 
-        full_context = self.current_post['url'].split('/')[-1]
+        full_context = self.current_post.url.split('/')[-1]
         thread_id = full_context.split('?')[0]
         try:
             highlight_id = full_context.split('?')[1].split('=')[1]
@@ -1182,14 +1356,19 @@ class StateNotifications(StateFeed):
         """Just here to make sure the parent function doesn't fuck up"""
         return False
 
+    def prefetch(self):
+        """Notifications don't have replies or images to fetch ahead of time"""
+        return None
+
     def update_menu_functions(self):
         """Update any menu functions that need updating"""
         # We override the parent function and update the view_notification option
+        state, args = self.get_notification_target_state()
         self.view_notification_func = {
             'type': 'state_change',
             'function': self.advance_state,
-            'state': self.get_notification_target_state()[0],
-            'args': self.get_notification_target_state()[1]
+            'state': state,
+            'args': args
         }
 
     def update_menu(self):
@@ -1198,6 +1377,13 @@ class StateNotifications(StateFeed):
         menu_items = self.menu.get_items()
         pointer_pos = self.menu.selection
         self.menu.clear_menu()
+
+        # Nothing to view until the notifications have arrived
+        if self.feed.is_loading():
+            self.menu.update_menu("Back", self.back_func, self.menu.get_num_items())
+            self.menu.selection = 0
+            return None
+
         self.update_menu_functions()
 
         # Now fill in menu options
@@ -1209,7 +1395,7 @@ class StateNotifications(StateFeed):
         if self.feed.post_index != len(self.feed.posts) - 1:
             self.menu.update_menu("Next Post", self.next_post_func, self.menu.get_num_items())
 
-        if self.current_post['url'] != "":
+        if self.current_post.url != "":
             self.menu.update_menu("View Notification", self.view_notification_func, self.menu.get_num_items())
         self.menu.update_menu("Back", self.back_func, self.menu.get_num_items())
 
@@ -1234,9 +1420,13 @@ class StateNotifications(StateFeed):
         """Draw the current notification"""
         # This is misleadingly named because we inherit the parent draw function
         # The parent function calls draw_post which is why we need to override it
-        notification_type = self.current_post['type']
-        # Convert to int to equate with enums
-        notification_type = int(notification_type)
+        # Placeholder while the notifications load
+        if self.feed.is_loading():
+            self.stdscr.addstr(self.current_post.snippet + "\n", curses.A_ITALIC)
+            return
+
+        # Type is converted to an int when the notification arrives to equate with enums
+        notification_type = self.current_post.kind
         if notification_type == NotificationType.LIKE.value:
             self.draw_liked_post()
         elif notification_type == NotificationType.REPLY.value:
@@ -1253,7 +1443,7 @@ class StateNotifications(StateFeed):
 
     def draw_liked_post(self):
         """Draws the 'liked post' notification"""
-        likers = self.current_post['actor'].split(';')
+        likers = self.current_post.actors
         text = ""
         if len(likers) == 1:
             text = f"@{likers[0]} liked your post"
@@ -1263,33 +1453,33 @@ class StateNotifications(StateFeed):
         # Output the text
         self.stdscr.addstr(text + "\n", self.colours.GREEN_BLACK)
         # Now we have a snippet which shows the post content
-        snippet = self.current_post['snippet']
+        snippet = self.current_post.snippet
         self.stdscr.addstr(snippet + "\n", curses.A_ITALIC)
 
     def draw_post_update(self):
         """Draws the 'post update' notification"""
-        updaters = self.current_post['actor'].split(';')
+        updaters = self.current_post.actors
         text = f"A post you are following has updates from {updaters[-1]}"
         if len(updaters) > 1:
             text += f" and {len(updaters) - 1} others"
 
         # Output + snippet
         self.stdscr.addstr(text + "\n", self.colours.GREEN_BLACK)
-        snippet = self.current_post['snippet']
+        snippet = self.current_post.snippet
         self.stdscr.addstr(snippet + "\n", curses.A_ITALIC)
 
     def draw_mention(self):
         """Draws the 'mention' notification"""
-        mentioner = self.current_post['actor']
+        mentioner = self.current_post.actor
         text = f"@{mentioner} mentioned you!"
-        snippet = self.current_post['snippet']
+        snippet = self.current_post.snippet
 
         self.stdscr.addstr(text + "\n", self.colours.GREEN_BLACK)
         self.stdscr.addstr(snippet + "\n", curses.A_ITALIC)
 
     def draw_follow(self):
         """Draws the 'follow' notification"""
-        follower = self.current_post['actor'].split(';')
+        follower = self.current_post.actors
         text = f"@{follower[0]} is now following you!"
 
         # I will assume if multiple people follow it gets joined into one notification
@@ -1302,9 +1492,9 @@ class StateNotifications(StateFeed):
 
     def draw_replied(self):
         """Draws the 'replied' notification"""
-        replier = self.current_post['actor']
+        replier = self.current_post.actor
         text = f"@{replier} replied to your post"
-        snippet = self.current_post['snippet']
+        snippet = self.current_post.snippet
 
         self.stdscr.addstr(text + "\n", self.colours.GREEN_BLACK)
         self.stdscr.addstr(snippet + "\n", curses.A_ITALIC)
@@ -1312,7 +1502,7 @@ class StateNotifications(StateFeed):
     def draw_misc(self):
         """Draws the 'misc' notification (unknown or event_update)"""
         text = "Some unknown notification type"
-        snippet = self.current_post['snippet']
+        snippet = self.current_post.snippet
 
         self.stdscr.addstr(text + "\n", self.colours.RED_BLACK)
         self.stdscr.addstr(snippet + "\n", curses.A_ITALIC)
@@ -1333,6 +1523,7 @@ class StateProfile(State):
         self.colours.init_colours()
 
         # Create a profile object
+        # This fetches in the background and gives us a placeholder until then
         self.profile = Profile(self.session, self.username)
         # Returns a dictionary
         self.profile_details = self.profile.get_profile()
@@ -1343,32 +1534,28 @@ class StateProfile(State):
         # Create an ascii art object from the profile's avi
         self.avi = None
 
-        our_username = secrets.get_username()
-        global bootlicking_cache
+        self.our_username = secrets.get_username()
         # Set up bootlickers if it's none
+        self.bootlickers_request = None
         if bootlicking_cache is None:
             # Make an API call to get whom we are bootlicking
-            params = [our_username]
-            response = david_api.query_api("bootlickers", params=params, cookies=self.session.cookies)
-            if response is None:
-                self.logger.error("bootlickers returned None")
-                bootlickers = []
-            else:
-                bootlickers = response
-                self.logger.info(f"Got {len(bootlickers)} bootlickers")
+            params = [self.our_username]
+            self.bootlickers_request = david_api.query_api_async("bootlickers", params=params, cookies=self.session.cookies)
 
-            # Save to cache
-            bootlicking_cache = bootlickers
-
-        # Let's see if we are bootlicking this profile
-        self.bootlicking = self.username in bootlicking_cache
-
-        # See if this user is bootlicking us
+        # We don't know any of this until the requests come back
+        self.bootlicking = False
         self.bootlicker = False
-        if our_username.lower() in [bl.lower() for bl in self.profile_details['following']]:
-            self.bootlicker = True
+        self.check_bootlicking()
+
+        # Setup menu, just a back button until the profile arrives
+        self.setup_menu_functions()
+        self.menu = Menu(self.stdscr, ["Back"], [self.back_func])
+        self.menu_built = False
+        if not self.profile.is_loading():
+            self.build_menu()
 
-        # Setup menu
+    def build_menu(self):
+        """Build the full menu once we have the profile"""
         self.setup_menu_functions()
         menu_items = ["View Feed", "View Avatar", "Bootlickers", "Bootlicking", "Back"]
         menu_functions = [
@@ -1379,7 +1566,43 @@ class StateProfile(State):
             self.back_func
         ]
         self.menu = Menu(self.stdscr, menu_items, menu_functions)
+        self.menu_built = True
+
+    def check_bootlicking(self):
+        """Work out who is bootlicking who, if we have the data for it"""
+        # Let's see if we are bootlicking this profile
+        if bootlicking_cache is not None:
+            self.bootlicking = self.username in bootlicking_cache
+
+        # See if this user is bootlicking us
+        self.bootlicker = False
+        if self.our_username.lower() in [bl.lower() for bl in self.profile_details['following']]:
+            self.bootlicker = True
 
+    def poll_requests(self):
+        """Check on the background requests and fill in their results"""
+        global bootlicking_cache
+        if self.bootlickers_request is not None and self.bootlickers_request.done():
+            response = executor.result(self.bootlickers_request)
+            self.bootlickers_request = None
+            if response is None:
+                self.logger.error("bootlickers returned None")
+                bootlickers = []
+            else:
+                bootlickers = response
+                self.logger.info(f"Got {len(bootlickers)} bootlickers")
+
+            # Save to cache
+            bootlicking_cache = bootlickers
+            self.check_bootlicking()
+
+        if self.profile.poll():
+            self.profile_details = self.profile.get_profile()
+            self.ticker.set_text(self.profile_details['status'])
+            self.check_bootlicking()
+            # We might have been showing a stored copy with the full menu already
+            if not self.menu_built:
+                self.build_menu()
 
     def setup_menu_functions(self):
         """Defines functions used by the menu"""
@@ -1426,16 +1649,31 @@ class StateProfile(State):
 
     def view_image(self):
         """View the image with PIL"""
-        img = Image.open(BytesIO(requests.get(self.profile_details['avi']).content))
+        content = image_cache.get(self.profile_details['avi'])
+        if content is None:
+            return None
+        img = Image.open(BytesIO(content))
         img.show()
 
     def update(self):
         """Update the state"""
+        self.poll_requests()
         # Update the ticker
         self.ticker.update()
         # Inherit the update function
         return super().update()
 
+    def get_components(self):
+        """Components with their own windows"""
+        return [self.ticker, self.avi, self.menu]
+
+    def cleanup(self):
+        """Clean up the state"""
+        # Stop rendering the avi if we leave before it's done
+        if self.avi is not None:
+            self.avi.close()
+        super().cleanup()
+
     def update_ascii(self):
         """Update the ascii art"""
         if self.avi is None:
@@ -1474,10 +1712,12 @@ class StateProfile(State):
         self.stdscr.addstr("\n")
         # Draw the profile
         self.draw_profile()
-        # Update avi here so we know our available space
-        self.update_ascii()
-        # Draw the avi
-        self.avi.draw()
+        # No avi to draw until the profile has loaded
+        if not self.profile.is_loading():
+            # Update avi here so we know our available space
+            self.update_ascii()
+            # Draw the avi
+            self.avi.draw()
         # Inherit the draw function
         super().draw()
 
@@ -1513,3 +1753,60 @@ class StateTextViewer(State):
         self.stdscr.addstr(self.text + "\n")
         # Inherit the draw function
         super().draw()
+
+class StateStats(State):
+    def __init__(self, stdscr, session, logger):
+        """Initialise the state"""
+        super().__init__()
+
+        self.stdscr = stdscr
+        self.session = session
+        self.logger = logger
+        self.logger.info('initialising StateStats')
+
+        # Redraw every so often so the numbers keep up with what's going on
+        self.refresh_interval = 1
+        self.started = monotonic()
+
+        # Initialise colours
+        self.colours = ColourConstants()
+        self.colours.init_colours()
+
+        # Create a menu with a back button
+        menu_items = ["Reset", "Back"]
+        menu_functions = [
+            {
+                'type': 'function',
+                'function': api_metrics.reset,
+                'args': []
+            },
+            {
+                'type': 'function',
+                'function': self.regress_state,
+                'args': []
+            }
+        ]
+        self.menu = Menu(self.stdscr, menu_items, menu_functions)
+
+    def next_deadline(self):
+        """Wake up to redraw the numbers"""
+        if self.callback is not None:
+            return 0
+        return self.refresh_interval - (monotonic() - self.started) % self.refresh_interval
+
+    def draw(self):
+        """Draw the state"""
+        rows, cols = self.stdscr.getmaxyx()
+        self.stdscr.addstr("API calls this session\n", self.colours.YELLOW_BLACK)
+        lines = api_metrics.table()
+        if len(lines) == 1:
+            self.stdscr.addstr("Nothing yet\n", curses.A_ITALIC)
+        else:
+            # Cut lines off rather than wrapping them so the table stays readable
+            # and leave room for the menu at the bottom
+            self.stdscr.addstr(lines[0][:cols - 1] + "\n", self.colours.GREEN_BLACK)
+            for line in lines[1:rows - 3]:
+                self.stdscr.addstr(line[:cols - 1] + "\n")
+
+        # Inherit the draw function
+        super().draw()
@@ -0,0 +1,76 @@
+import weakref
+from scripts.models import Post
+
+# One copy of every post and profile for the whole app
+# The same post turns up in the bootlicker feed, the global feed, a user's feed, reply threads...
+# so every feed holds the object from here and a like or an edit shows up everywhere at once
+# Posts are held weakly, they stay around as long as some feed is using them
+_posts = weakref.WeakValueDictionary()
+# Profiles by lowercase username
+_profiles = {}
+# Feeds that need telling when a post is deleted
+_feeds = weakref.WeakSet()
+
+def post_key(id):
+    """Normalise a post id for lookups, ids come back from the API as ints
+    but get passed around as strings too"""
+    try:
+        return int(id)
+    except (TypeError, ValueError):
+        return id
+
+def get_post(id):
+    """Get a post we already have, None if we don't"""
+    return _posts.get(post_key(id))
+
+def put_post(data):
+    """Add a post from an API response
+    If we already have the post it is updated in place and that object is returned"""
+    key = post_key(data["id"])
+    post = _posts.get(key)
+    if post is None:
+        post = Post(data)
+        _posts[key] = post
+    else:
+        post.update(data)
+    return post
+
+def put_saved_post(data):
+    """Add a post saved from last time
+    If we already have the post it's newer than the saved one so it's left alone"""
+    key = post_key(data["id"])
+    post = _posts.get(key)
+    if post is None:
+        post = Post(data)
+        _posts[key] = post
+    return post
+
+def register_feed(feed):
+    """Keep track of a feed so deleted posts can be taken out of it"""
+    _feeds.add(feed)
+
+def delete_post(id):
+    """Remove a post from the store and every feed that has it"""
+    key = post_key(id)
+    _posts.pop(key, None)
+    for feed in list(_feeds):
+        feed.drop_post(key)
+
+def get_profile(username):
+    """Get a profile we already have, None if we don't"""
+    return _profiles.get(username.lower())
+
+def put_profile(username, profile):
+    """Add a profile from an API response
+    If we already have the profile it is updated in place and that dict is returned"""
+    key = username.lower()
+    if key not in _profiles:
+        _profiles[key] = profile
+    elif _profiles[key] is not profile:
+        _profiles[key].clear()
+        _profiles[key].update(profile)
+    return _profiles[key]
+
+def stats():
+    """How much is in the store, for profiling"""
+    return {"posts": len(_posts), "profiles": len(_profiles), "feeds": len(_feeds)}
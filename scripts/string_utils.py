@@ -1,58 +1,26 @@
-import requests
 from PIL import Image
 from io import BytesIO
 import curses
+import scripts.image_cache as image_cache
+import scripts.tracer as tracer
 
 # Define the ascii characters to use for the image
 # ascii_chars = list("$@B%8&WM#*oahkbdpqwmZO0QLCJUYXzcvunxrjft/\|()1{}[]?-_+~<>i!lI;:,\"^`'.")
 # Alt, smaller gradient (looks better imo)
 ascii_chars = list(" .:-=+*#%@")[::-1]
 
-def image_to_ascii(image, url=True, dim_adjust=(0, 0)):
-    """Definitely not plaigarised from https://www.askpython.com/python/examples/turn-images-to-ascii-art-using-python"""
-    if url:
-        image = get_image(image)
-        exif = image.getexif()
-        rot = exif.get(274, None)
-        width, height = image.size
-        max_size = (max(width, height), max(width, height))
-        rotated_size = (height, width)
-        """Guide to rotation values:
-        1 = Horizontal (normal)
-        2 = Mirror horizontal
-        3 = Rotate 180
-        4 = Mirror vertical
-        5 = Mirror horizontal and rotate 270 CW
-        6 = Rotate 90 CW
-        7 = Mirror horizontal and rotate 90 CW
-        8 = Rotate 270 CW"""
-        # Process the image as necessary using a dictionary with functions
-        rot_dict = {
-            1: lambda x: x,
-            2: lambda x: x.transpose(Image.FLIP_LEFT_RIGHT),
-            3: lambda x: x.rotate(180),
-            4: lambda x: x.rotate(180).transpose(Image.FLIP_LEFT_RIGHT),
-            5: lambda x: x.resize(max_size).rotate(-90).transpose(Image.FLIP_LEFT_RIGHT).resize(rotated_size),
-            6: lambda x: x.resize(max_size).rotate(-90).resize(rotated_size),
-            7: lambda x: x.resize(max_size).rotate(90).transpose(Image.FLIP_LEFT_RIGHT).resize(rotated_size),
-            8: lambda x: x.resize(max_size).rotate(90).resize(rotated_size),
-        }
-        if rot is not None:
-            image = rot_dict[rot](image)
-    else:
-        image = Image.open(image)
-        image = image.convert("RGBA")
-    if image is None:
-        return None
-
-    # Resize the image
+def get_available_size(dim_adjust=(0, 0), screen=None):
+    """Get the space an image can take up from the cursor position on the screen (stdscr if not given)
+    Returns: (width, height) in characters"""
+    if screen is None:
+        screen = curses.initscr()
     # This checks for the available space in the terminal
-    MAX_HEIGHT, MAX_WIDTH = curses.initscr().getmaxyx()
+    MAX_HEIGHT, MAX_WIDTH = screen.getmaxyx()
     # Need to take 1 off max width for some reason otherwise the printing is fucky
     MAX_WIDTH -= 1
 
     # Also account for current cursor position
-    curs_y, curs_x = curses.initscr().getyx()
+    curs_y, curs_x = screen.getyx()
 
     MAX_HEIGHT -= curs_y
     MAX_WIDTH -= curs_x
@@ -60,42 +28,124 @@ def image_to_ascii(image, url=True, dim_adjust=(0, 0)):
     # Adjust dimensions
     MAX_WIDTH -= dim_adjust[0]
     MAX_HEIGHT -= dim_adjust[1]
+    return MAX_WIDTH, MAX_HEIGHT
+
+"""Guide to EXIF orientation values:
+1 = Horizontal (normal)
+2 = Mirror horizontal
+3 = Rotate 180
+4 = Mirror vertical
+5 = Mirror horizontal and rotate 270 CW
+6 = Rotate 90 CW
+7 = Mirror horizontal and rotate 90 CW
+8 = Rotate 270 CW"""
+EXIF_ORIENTATION = 274
+orientation_transforms = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+# These swap the width and height
+rotated_orientations = (5, 6, 7, 8)
+
+def image_to_ascii(image, url=True, dim_adjust=(0, 0), size=None):
+    """Definitely not plaigarised from https://www.askpython.com/python/examples/turn-images-to-ascii-art-using-python"""
+    with tracer.span("image_to_ascii", "image", {"url": url}):
+        image = get_image(image) if url else Image.open(image)
+        if image is None:
+            return None
+
+        # Resize the image to fit the space available in the terminal
+        if size is None:
+            size = get_available_size(dim_adjust)
+
+        return render_ascii(image, *size)
 
-    image, new_width, new_height = resize_image(image, MAX_WIDTH, MAX_HEIGHT)
+def load_image_bytes(image, url=True):
+    """Get the raw bytes of an image from a url (through the disk cache) or a file
+    Returns None if the image can't be loaded"""
+    if url:
+        return image_cache.get(image)
+    try:
+        with open(image, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def bytes_to_ascii(content, max_width, max_height):
+    """Convert the raw bytes of an image to ascii art
+    Top level and only takes plain arguments so it can run in a worker process"""
+    if content is None:
+        return None
+    with tracer.span("bytes_to_ascii", "image", {"bytes": len(content)}):
+        return render_ascii(Image.open(BytesIO(content)), max_width, max_height)
+
+def render_ascii(image, max_width, max_height):
+    """Convert an opened (but not yet decoded) image to ascii art that fits in the given space
+    The image is downscaled as early as possible so the work depends on the terminal size
+    rather than how big the photo is"""
+    with tracer.span("render_ascii", "image", {"size": f"{max_width}x{max_height}"}):
+        orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+        rotated = orientation in rotated_orientations
 
+        # Work out the size of the art the right way up, then the size that is before orientating
+        width, height = image.size
+        if rotated:
+            width, height = height, width
+        new_width, new_height = fit_size(width, height, max_width, max_height)
+        decode_size = (new_height, new_width) if rotated else (new_width, new_height)
+
+        if "A" in image.getbands() or "transparency" in image.info:
+            # Resize with the alpha channel so see-through pixels come out black like they always have
+            # (the resize weights colours by alpha, fully transparent ends up as 0)
+            image = image.convert("RGBA").resize(decode_size).convert("L")
+        else:
+            # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale which saves most of the work for big photos
+            image.draft("RGB", decode_size)
+            # Nothing to lose by going greyscale first so we're only pushing one channel around
+            image = image.convert("L")
+            image = image.resize(decode_size, reducing_gap=3.0)
+
+        # Orientate the small image rather than the big one
+        if orientation in orientation_transforms:
+            image = image.transpose(orientation_transforms[orientation])
 
-    # Convert to greyscale
-    image = image.convert('L')
-    # Convert to ascii chars
-    pixels = image.getdata()
+        return pixels_to_ascii(image, new_width)
+
+def build_ascii_table(chars=ascii_chars):
+    """Build a 256 entry lookup table mapping each greyscale value to an ascii char
+    Used with bytes.translate so the whole image is converted in one call"""
     # Calculate how much to divide by based on ascii_chars list length
-    div = 255/(len(ascii_chars))
+    div = 255/(len(chars))
     # Use min() to avoid index out of range errors which happen for some reason and I'm too stupid/lazy to fix
-    new_pixels = [ascii_chars[min(round(pixel/div), len(ascii_chars) - 1)] for pixel in pixels]
-    new_pixels = ''.join(new_pixels)
+    return bytes(ord(chars[min(round(pixel/div), len(chars) - 1)]) for pixel in range(256))
+
+ascii_table = build_ascii_table()
 
-    # split string of chars into multiple strings of length equal to new width and create a list
-    new_pixels_count = len(new_pixels)
-    ascii_image = [new_pixels[index:index + new_width] for index in range(0, new_pixels_count, new_width)]
-    ascii_image = "\n".join(ascii_image)
-    return ascii_image
+def pixels_to_ascii(image, width, table=ascii_table):
+    """Convert an already resized image to ascii art, one line per row of pixels"""
+    # Convert to greyscale, one byte per pixel
+    pixels = image.convert('L').tobytes()
+    # Map every pixel through the lookup table in one go
+    chars = pixels.translate(table).decode("ascii")
+    # Split into rows of length equal to width
+    return "\n".join(chars[index:index + width] for index in range(0, len(chars), width))
 
 def get_image(image_url):
-    """Get an image from a url"""
-    response = requests.get(image_url)
-    if response.status_code == 200:
-        img = Image.open(BytesIO(response.content))
-        # Convert otherwise it yells at me for some reason
-        # This is a public repo why am I writing things like this
-        img = img.convert("RGBA")
-        return img
-    else:
+    """Get an image from a url, going through the disk cache
+    The image is only opened, it gets decoded when it's converted"""
+    content = image_cache.get(image_url)
+    if content is None:
         return None
+    return Image.open(BytesIO(content))
 
-def resize_image(img, max_width, max_height):
-    """Resize an image to a max width"""
+def fit_size(width, height, max_width, max_height):
+    """Work out the size in characters to draw an image so it fits in the given space"""
     # Code I definitely didn't find online to resize the image lol
-    width, height = img.size
     aspect_ratio = height/width
     new_width = max_width
     # Font is taller than it is wide so we need to reduce the height by a factor
@@ -108,5 +158,4 @@ def resize_image(img, max_width, max_height):
         new_height = max_height
         new_width = int(new_height/(reduction_factor * aspect_ratio))
 
-    img = img.resize((new_width, new_height))
-    return img, new_width, new_height
+    return new_width, new_height
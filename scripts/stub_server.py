@@ -0,0 +1,452 @@
+import io
+import sys
+import json
+import random
+import argparse
+import threading
+from time import sleep
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from PIL import Image
+from scripts.api_routes import routes, route_params
+from scripts.models import TIMESTAMP_FORMAT
+
+# A stand-in for the David Social API that runs locally with generated data
+# so feeds, images and startup can be measured without the live server
+# Run with: python -m scripts.stub_server
+# Then point the CLI at it with: python david.py --base-url http://127.0.0.1:8000
+
+# Global feed windows count pages rather than posts, this many to a page by default
+GLOBAL_PAGE_SIZE = 50
+# Bodies are written in chunks this size when throttling bandwidth
+CHUNK_SIZE = 16 * 1024
+
+class Fixtures():
+    """Generated users, posts and notifications, the same seed always gives the same data"""
+    def __init__(self, base_url, num_posts=5000, num_users=50, seed=0, avatar_size=1024, image_size=(1600, 1200)):
+        self.base_url = base_url
+        self.avatar_size = avatar_size
+        self.image_size = image_size
+        self.random = random.Random(seed)
+        # Anything that changes the data happens on request threads
+        self.lock = threading.Lock()
+        # Generated images by path, only made when someone asks for them
+        self.images = {}
+
+        self.users = ["David", "eatkin"] + [f"user{i}" for i in range(num_users - 2)]
+        self.following = {user.lower(): self.random.sample(self.users, min(10, len(self.users))) for user in self.users}
+        self.profiles = {user.lower(): self.make_profile(user) for user in self.users}
+
+        self.posts = {}
+        # Top level posts, newest first
+        self.feed = []
+        self.replies = {}
+        self.notifications = {user.lower(): [] for user in self.users}
+        self.ticker_text = "<p>Welcome to the David Social stub server</p>"
+        self.cat_pets = 0
+        self.start = datetime(2024, 1, 1)
+        self.next_id = 1
+
+        for i in range(num_posts):
+            post = self.add_post(self.random.choice(self.users), self.make_content())
+            # Every so often a long thread, otherwise a handful of replies now and then
+            if i % 100 == 99:
+                num_replies = 200
+            elif self.random.random() < 0.2:
+                num_replies = self.random.randint(1, 10)
+            else:
+                num_replies = 0
+            for _ in range(num_replies):
+                self.add_post(self.random.choice(self.users), self.make_content(), reply_to=post["id"])
+
+    def make_content(self):
+        words = ["david", "cat", "bootlicker", "ticker", "post", "social", "terminal", "ascii", "pet", "feed"]
+        return " ".join(self.random.choice(words) for _ in range(self.random.randint(3, 60)))
+
+    def make_profile(self, username):
+        return {
+            "name": username.capitalize(),
+            "bio": "null" if self.random.random() < 0.3 else f"I'm {username} and I love David",
+            "facts": {"Favourite colour": self.random.choice(["Red", "Blue", ""]), "Star sign": "Leo"},
+            "avi": f"{self.base_url}/images/avi/{username.lower()}.png",
+            "bootlickers": [user for user in self.users if username in self.following[user.lower()]],
+            "following": self.following[username.lower()],
+            "posts": [],
+            "status": f"{username} is posting",
+        }
+
+    def add_post(self, username, content, reply_to=None):
+        """Make a new post (or reply), returns it"""
+        id = self.next_id
+        self.next_id += 1
+        post = {
+            "id": id,
+            "username": username,
+            "content": content,
+            "likes": 0,
+            "avi": f"{self.base_url}/images/avi/{username.lower()}.png",
+            # One in eight posts has a picture
+            "attached_image": f"{self.base_url}/images/post/{id}.jpg" if id % 8 == 0 else "",
+            "userid": self.users.index(username) if username in self.users else None,
+            "timestamp": (self.start + timedelta(minutes=id)).strftime(TIMESTAMP_FORMAT),
+            "reply_to": reply_to,
+            "liked_by": [],
+            "ncomments": 0,
+            # David picks the odd post to stick in everyone's feed
+            "david_selection": id % 97 == 0,
+        }
+        likers = self.random.sample(self.users, self.random.randint(0, 5))
+        for liker in likers:
+            self.like(post, liker)
+
+        self.posts[id] = post
+        self.replies[id] = []
+        if reply_to is None:
+            self.feed.insert(0, post)
+        else:
+            parent = self.posts[reply_to]
+            self.replies[reply_to].append(post)
+            parent["ncomments"] += 1
+            self.notify(parent["username"], username, 1, f"/~/thread/{reply_to}?highlight={id}", content)
+        return post
+
+    def like(self, post, username):
+        if username in post["liked_by"]:
+            return
+        post["liked_by"].append(username)
+        post["likes"] += 1
+        self.notify(post["username"], username, 0, f"/~/thread/{post['id']}", post["content"])
+
+    def notify(self, username, actor, type, url, snippet):
+        if username == actor or username.lower() not in self.notifications:
+            return
+        notifications = self.notifications[username.lower()]
+        notifications.insert(0, {
+            "id": len(notifications) + 1,
+            "actor": actor,
+            "url": url,
+            "snippet": snippet[:50],
+            "time": (self.start + timedelta(minutes=self.next_id)).strftime(TIMESTAMP_FORMAT),
+            "type": str(type),
+            "to_notify": username,
+            "seen": False,
+        })
+
+    def feed_page(self, posts, window, before, cursors=True):
+        """Up to window posts, only the ones older than before if there's a cursor
+        Without cursors before is ignored like the real server used to"""
+        if cursors and before is not None:
+            posts = [post for post in posts if post["id"] < int(before)]
+        return posts[:window]
+
+    def get_image(self, path):
+        """Generate an avatar or attached image the first time it's asked for"""
+        if path not in self.images:
+            seed = sum(path.encode())
+            if path.startswith("/images/avi/"):
+                size, format = (self.avatar_size, self.avatar_size), "PNG"
+            else:
+                size, format = self.image_size, "JPEG"
+            # Gradient with some noise so it doesn't compress down to nothing
+            gradient = Image.radial_gradient("L").resize(size)
+            noise = Image.effect_noise(size, 40 + seed % 60)
+            image = Image.merge("RGB", (gradient, noise, gradient.rotate(seed % 360)))
+            buffer = io.BytesIO()
+            image.save(buffer, format)
+            # Images never change so the seed makes a fine ETag
+            self.images[path] = (buffer.getvalue(), f"image/{format.lower()}", f'"{seed}-{buffer.tell()}"')
+        return self.images[path]
+
+def parse_id(value):
+    """A post id from the request, None if it's missing or isn't a number"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+BAD_ID = (400, {"error": "Missing or invalid id"})
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Handles every route in api_routes with the fixture data"""
+    fixtures = None
+    # Injected faults, change them at any time
+    latency = 0.0
+    # Bytes per second, 0 for unlimited
+    bandwidth = 0
+    error_rate = 0.0
+    # Posts per page of the global feed
+    page_size = GLOBAL_PAGE_SIZE
+    # Whether feeds take a cursor, turn off to act like an old server
+    cursors = True
+    # Logged in sessions to usernames
+    sessions = {}
+    # What's been sent, for measuring how much the client downloads
+    requests_served = 0
+    bytes_sent = 0
+
+    # Routes by path
+    paths = {path: route for route, (method, path) in routes.items()}
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        with self.fixtures.lock:
+            cls = type(self)
+            cls.requests_served += 1
+            cls.bytes_sent += len(body)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        if not self.bandwidth:
+            self.wfile.write(body)
+            return
+        for i in range(0, len(body), CHUNK_SIZE):
+            chunk = body[i:i + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            sleep(len(chunk) / self.bandwidth)
+
+    def get_params(self, route):
+        """The client sends parameters both in the query string and as a json body"""
+        params = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            try:
+                params.update(json.loads(self.rfile.read(length)) or {})
+            except ValueError:
+                pass
+        return {name: params.get(name) for name in route_params[route]}
+
+    def get_user(self):
+        """Who is logged in, from the session cookie"""
+        for cookie in (self.headers.get("Cookie") or "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == "session":
+                return self.sessions.get(value)
+        return None
+
+    def handle_request(self):
+        sleep(self.latency)
+        if self.error_rate and self.fixtures.random.random() < self.error_rate:
+            return self.send_body(500, b"Internal Server Error", "text/html")
+
+        path = urlparse(self.path).path
+        if path.startswith("/images/"):
+            image, content_type, etag = self.fixtures.get_image(path)
+            if self.headers.get("If-None-Match") == etag:
+                return self.send_body(304, b"", content_type, {"ETag": etag})
+            return self.send_body(200, image, content_type, {"ETag": etag})
+
+        route = self.paths.get(path)
+        if route is None:
+            return self.send_body(404, b"Not Found", "text/html")
+
+        params = self.get_params(route)
+        try:
+            with self.fixtures.lock:
+                response = getattr(self, "route_" + route.replace("-", "_"))(params)
+        except (TypeError, ValueError) as e:
+            # Anything else we couldn't make sense of (windows, cursors...)
+            return self.send_body(400, {"error": f"Bad request: {e}"})
+        if response is None:
+            return self.send_body(404, b"null")
+        if isinstance(response, tuple):
+            return self.send_body(*response)
+        return self.send_body(200, response)
+
+    do_GET = handle_request
+    do_POST = handle_request
+
+    # Routes
+    # Each gets the request parameters and returns the json response, None for 404
+    # or (status, body, content type, headers) for anything else
+
+    def route_ping(self, params):
+        return 200, b"pong", "text/html"
+
+    def route_version(self, params):
+        return {"version": "stub"}
+
+    def route_avi_url(self, params):
+        profile = self.fixtures.profiles.get((params["username"] or "").lower())
+        return None if profile is None else profile["avi"]
+
+    def route_user_posts(self, params):
+        username = (params["username"] or "").lower()
+        return [post for post in self.fixtures.feed if post["username"].lower() == username]
+
+    def route_replies(self, params):
+        id = parse_id(params["id"])
+        if id is None:
+            return BAD_ID
+        return self.fixtures.replies.get(id)
+
+    def route_get_post(self, params):
+        id = parse_id(params["id"])
+        if id is None:
+            return BAD_ID
+        return self.fixtures.posts.get(id)
+
+    def route_user_list(self, params):
+        return self.fixtures.users
+
+    def route_bootlickers(self, params):
+        profile = self.fixtures.profiles.get((params["username"] or "").lower())
+        return None if profile is None else profile["bootlickers"]
+
+    def route_bootlicking(self, params):
+        profile = self.fixtures.profiles.get((params["username"] or "").lower())
+        return None if profile is None else profile["following"]
+
+    def route_liked_by(self, params):
+        id = parse_id(params["id"])
+        if id is None:
+            return BAD_ID
+        post = self.fixtures.posts.get(id)
+        return None if post is None else post["liked_by"]
+
+    def route_profile(self, params):
+        return self.fixtures.profiles.get((params["username"] or "").lower())
+
+    def route_get_ticker_text(self, params):
+        return {"tickerText": self.fixtures.ticker_text}
+
+    def route_login(self, params):
+        username = params["username"] or ""
+        if username.lower() not in self.fixtures.profiles:
+            return 401, {"error": "Unknown user"}
+        token = f"{username.lower()}-{len(self.sessions)}"
+        self.sessions[token] = next(user for user in self.fixtures.users if user.lower() == username.lower())
+        return 200, {"success": True}, "application/json", {"Set-Cookie": f"session={token}; Path=/"}
+
+    def route_global_feed(self, params):
+        window = int(params["window"] or 1)
+        # With a cursor the window isn't grown, so it's always one page
+        return self.fixtures.feed_page(self.fixtures.feed, window * self.page_size, params["before"], self.cursors)
+
+    def route_bootlicker_feed(self, params):
+        user = self.get_user()
+        if user is None:
+            return 401, {"error": "Not logged in"}
+        following = set(name.lower() for name in self.fixtures.following[user.lower()]) | {user.lower()}
+        posts = [post for post in self.fixtures.feed if post["username"].lower() in following or post["david_selection"]]
+        return self.fixtures.feed_page(posts, int(params["window"] or 50), params["before"], self.cursors)
+
+    def route_new_post(self, params):
+        user = self.get_user()
+        if user is None:
+            return 401, {"error": "Not logged in"}
+        reply_to = None
+        if params["replyTo"] not in (None, "", "null"):
+            reply_to = parse_id(params["replyTo"])
+            if reply_to is None:
+                return BAD_ID
+        if reply_to is not None and reply_to not in self.fixtures.posts:
+            return None
+        return self.fixtures.add_post(user, params["text"] or "", reply_to=reply_to)
+
+    def route_delete_post(self, params):
+        id = parse_id(params["id"])
+        if id is None:
+            return BAD_ID
+        user = self.get_user()
+        post = self.fixtures.posts.get(id)
+        if post is None:
+            return None
+        if user is None or post["username"] != user:
+            return 403, {"error": "Not your post"}
+        del self.fixtures.posts[post["id"]]
+        if post["reply_to"] is None:
+            self.fixtures.feed.remove(post)
+        elif post["reply_to"] in self.fixtures.posts:
+            self.fixtures.replies[post["reply_to"]].remove(post)
+            self.fixtures.posts[post["reply_to"]]["ncomments"] -= 1
+        return {"success": True}
+
+    def route_like_post(self, params):
+        id = parse_id(params["id"])
+        if id is None:
+            return BAD_ID
+        user = self.get_user()
+        post = self.fixtures.posts.get(id)
+        if post is None:
+            return None
+        if user is None:
+            return 401, {"error": "Not logged in"}
+        self.fixtures.like(post, user)
+        return {"likes": post["likes"]}
+
+    def route_my_notifications(self, params):
+        user = self.get_user()
+        if user is None:
+            return 401, {"error": "Not logged in"}
+        return self.fixtures.notifications[user.lower()]
+
+    def route_public_set_ticker_text(self, params):
+        self.fixtures.ticker_text = f"<p>{params['text'] or ''}</p>"
+        return {"success": True}
+
+    def route_pet_cat(self, params):
+        self.fixtures.cat_pets += 1
+        return {"success": True}
+
+    def route_get_cat_pets(self, params):
+        return {"pets": self.fixtures.cat_pets}
+
+def serve(host="127.0.0.1", port=0, num_posts=5000, num_users=50, seed=0, avatar_size=1024,
+          latency=0.0, bandwidth=0, error_rate=0.0, page_size=GLOBAL_PAGE_SIZE, cursors=True):
+    """Start the stub server on a background thread
+    Settings can be changed later on server.RequestHandlerClass
+    Returns: (server, base url), stop it with server.shutdown()"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    base_url = f"http://{host}:{server.server_port}"
+    # Each server gets its own handler class so settings don't leak between them
+    handler = type("StubHandler", (StubHandler,), {
+        "fixtures": Fixtures(base_url, num_posts=num_posts, num_users=num_users, seed=seed, avatar_size=avatar_size),
+        "latency": latency,
+        "bandwidth": bandwidth,
+        "error_rate": error_rate,
+        "page_size": page_size,
+        "cursors": cursors,
+        "sessions": {},
+    })
+    server.RequestHandlerClass = handler
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the David Social API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--posts", type=int, default=5000, help="number of top level posts")
+    parser.add_argument("--users", type=int, default=50, help="number of users (David and eatkin are always there)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--avatar-size", type=int, default=1024, help="width and height of avatars in pixels")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes per second, 0 for unlimited")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail with a 500")
+    parser.add_argument("--page-size", type=int, default=GLOBAL_PAGE_SIZE, help="posts per page of the global feed")
+    parser.add_argument("--no-cursors", action="store_true", help="ignore feed cursors like an old server")
+    args = parser.parse_args()
+
+    print("Generating fixtures...")
+    server, base_url = serve(args.host, args.port, num_posts=args.posts, num_users=args.users, seed=args.seed,
+                             avatar_size=args.avatar_size, latency=args.latency, bandwidth=args.bandwidth,
+                             error_rate=args.error_rate, page_size=args.page_size, cursors=not args.no_cursors)
+    print(f"Serving on {base_url}, log in as any of {', '.join(server.RequestHandlerClass.fixtures.users[:3])}...")
+    print(f"Run the CLI with: python david.py --base-url {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
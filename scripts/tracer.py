@@ -0,0 +1,134 @@
+import os
+import json
+import threading
+from time import perf_counter
+
+# Timeline of a session for --trace, written as Chrome trace event JSON
+# Open it in https://ui.perfetto.dev or chrome://tracing to see every frame, API call,
+# image conversion and state change on one timeline, one row per thread
+# Format: https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+# Everything here is a no-op until start() is called
+
+# Stop recording after this many events so a long session can't eat all the memory
+MAX_EVENTS = 200000
+
+_enabled = False
+_origin = 0.0
+_events = []
+_dropped = 0
+# Native thread ids we've already named in the trace
+_threads = set()
+
+def start():
+    """Start recording"""
+    global _enabled, _origin
+    _enabled = True
+    _origin = perf_counter()
+
+def enabled():
+    return _enabled
+
+def _thread_id():
+    """Id of the current thread, naming it in the trace the first time we see it"""
+    tid = threading.get_native_id()
+    if tid not in _threads:
+        _threads.add(tid)
+        _events.append({"ph": "M", "name": "thread_name", "pid": os.getpid(), "tid": tid,
+                        "args": {"name": threading.current_thread().name}})
+    return tid
+
+def _add(event):
+    global _dropped
+    if len(_events) >= MAX_EVENTS:
+        _dropped += 1
+        return
+    event["pid"] = os.getpid()
+    event["tid"] = _thread_id()
+    _events.append(event)
+
+def complete(name, category, start, end, args=None):
+    """Record something that ran from start to end (perf_counter times)"""
+    if not _enabled:
+        return
+    event = {"ph": "X", "name": name, "cat": category,
+             "ts": (start - _origin) * 1e6, "dur": (end - start) * 1e6}
+    if args:
+        event["args"] = args
+    _add(event)
+
+def instant(name, category, args=None):
+    """Record something that happened at a point in time"""
+    if not _enabled:
+        return
+    event = {"ph": "i", "s": "p", "name": name, "cat": category, "ts": (perf_counter() - _origin) * 1e6}
+    if args:
+        event["args"] = args
+    _add(event)
+
+class Span():
+    """Times a with block"""
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        complete(self.name, self.category, self.start, perf_counter(), self.args)
+        return False
+
+class NoSpan():
+    """Stands in for a span when we're not tracing"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+# One of these is shared so a disabled span doesn't allocate anything
+no_span = NoSpan()
+
+def span(name, category, args=None):
+    """Time a with block, e.g. with tracer.span("render_ascii", "image"): ..."""
+    if not _enabled:
+        return no_span
+    return Span(name, category, args)
+
+def origin():
+    """When the trace started, worker processes need it to line their events up with ours"""
+    return _origin
+
+def call_traced(origin, function, *args):
+    """Run a function in a worker process and send back the events it recorded
+    Returns: (the function's result, events)"""
+    global _enabled, _origin
+    # perf_counter is the same clock in every process so times from here line up with the app's
+    _enabled = True
+    _origin = origin
+    result = function(*args)
+    events = _events[:]
+    # Workers are reused, don't send the same events twice
+    _events.clear()
+    return result, events
+
+def merge(events):
+    """Add events recorded in a worker process"""
+    for event in events:
+        if len(_events) >= MAX_EVENTS:
+            break
+        _events.append(event)
+
+def write(path):
+    """Write the trace to a file"""
+    if not _enabled:
+        return None
+    with open(path, "w") as f:
+        json.dump({
+            "traceEvents": _events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": _dropped},
+        }, f)
+    return path
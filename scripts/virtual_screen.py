@@ -0,0 +1,296 @@
+import curses
+from collections import deque
+from contextlib import contextmanager
+
+# An in-memory stand-in for a curses terminal so states and components can be drawn
+# without one, for timing renders in a loop and checking what ends up on screen
+# Use it with:
+#     with headless(30, 100, keys=["KEY_DOWN", "\n"]) as screen:
+#         state = StateMain(screen.stdscr, session, logger)
+#         Renderer(screen.stdscr).render(state, full=True)
+#         print(screen.snapshot())
+
+# Functions swapped out of the curses module while headless
+# Anything that needs a real terminal is either faked by the screen or does nothing
+PATCHED = ["initscr", "newwin", "doupdate", "color_pair", "init_pair", "start_color", "curs_set",
+           "update_lines_cols", "flushinp", "noecho", "echo", "cbreak", "nocbreak", "endwin"]
+
+def key_code(key):
+    """Turn a scripted key into what getch would return
+    Keys can be codes, single characters or curses key names like "KEY_UP" """
+    if isinstance(key, int):
+        return key
+    if len(key) == 1:
+        return ord(key)
+    return getattr(curses, key)
+
+class VirtualWindow():
+    """A curses window that draws into a grid of characters"""
+    def __init__(self, screen, height, width, y=0, x=0):
+        self.screen = screen
+        self.begin_y = y
+        self.begin_x = x
+        self.resize(height, width)
+        # Input settings, -1 is blocking like curses
+        self.delay = -1
+
+    def resize(self, height, width):
+        self.height = height
+        self.width = width
+        self.cells = [[" "] * width for _ in range(height)]
+        self.attrs = [[0] * width for _ in range(height)]
+        self.y = 0
+        self.x = 0
+        self.attr = 0
+
+    # Drawing
+
+    def addstr(self, *args):
+        """addstr(text), addstr(text, attr), addstr(y, x, text) or addstr(y, x, text, attr)
+        Raises curses.error when the text runs off the bottom of the window, just like curses"""
+        if isinstance(args[0], int):
+            self.move(args[0], args[1])
+            args = args[2:]
+        text = args[0]
+        attr = args[1] if len(args) > 1 else self.attr
+        if isinstance(text, bytes):
+            text = text.decode()
+
+        for i, line in enumerate(text.split("\n")):
+            if i > 0:
+                self.newline()
+            if "\t" in line:
+                line = (" " * self.x + line).expandtabs(8)[self.x:]
+            while line:
+                chunk = line[:self.width - self.x]
+                end = self.x + len(chunk)
+                self.cells[self.y][self.x:end] = chunk
+                self.attrs[self.y][self.x:end] = [attr] * len(chunk)
+                line = line[len(chunk):]
+                self.x = end
+                if self.x >= self.width:
+                    # Wrap onto the next line, unless there isn't one
+                    if self.y == self.height - 1:
+                        self.x = self.width - 1
+                        raise curses.error("addwstr() returned ERR")
+                    self.y += 1
+                    self.x = 0
+
+    def addch(self, *args):
+        if isinstance(args[0], int) and len(args) > 2:
+            self.move(args[0], args[1])
+            args = args[2:]
+        ch = args[0]
+        self.addstr(chr(ch) if isinstance(ch, int) else ch, *args[1:])
+
+    def newline(self):
+        """Clear the rest of the line and move to the start of the next one"""
+        self.clrtoeol()
+        if self.y == self.height - 1:
+            raise curses.error("addwstr() returned ERR")
+        self.y += 1
+        self.x = 0
+
+    def clrtoeol(self):
+        self.cells[self.y][self.x:] = [" "] * (self.width - self.x)
+        self.attrs[self.y][self.x:] = [0] * (self.width - self.x)
+
+    def erase(self):
+        for y in range(self.height):
+            self.cells[y] = [" "] * self.width
+            self.attrs[y] = [0] * self.width
+        self.y = 0
+        self.x = 0
+
+    # Clearing also makes curses redraw the whole terminal, which doesn't matter here
+    clear = erase
+
+    def move(self, y, x):
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("wmove() returned ERR")
+        self.y = y
+        self.x = x
+
+    def attron(self, attr):
+        self.attr |= attr
+
+    def attroff(self, attr):
+        self.attr &= ~attr
+
+    def attrset(self, attr):
+        self.attr = attr
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def getyx(self):
+        return self.y, self.x
+
+    def getbegyx(self):
+        return self.begin_y, self.begin_x
+
+    def mvwin(self, y, x):
+        self.begin_y = y
+        self.begin_x = x
+
+    def instr(self, y, x, n=None):
+        """Text on a line of the window, like curses"""
+        row = self.cells[y][x:]
+        return "".join(row[:n] if n is not None else row).encode()
+
+    def text(self):
+        """Everything in the window as lines of text"""
+        return ["".join(row).rstrip() for row in self.cells]
+
+    # Output
+
+    def noutrefresh(self):
+        self.screen.copy(self)
+
+    def refresh(self):
+        self.noutrefresh()
+        self.screen.doupdate()
+
+    def touchwin(self):
+        pass
+
+    # Input
+
+    def getch(self):
+        """Next scripted key, -1 if there isn't one"""
+        return self.screen.next_key()
+
+    def getkey(self):
+        key = self.getch()
+        if key == -1:
+            raise curses.error("no input")
+        return chr(key) if key < 256 else curses.keyname(key).decode()
+
+    def getstr(self, *args):
+        """Read scripted keys up to enter, like getstr with echo off"""
+        chars = []
+        while True:
+            key = self.getch()
+            if key in (-1, 10, 13, curses.KEY_ENTER):
+                break
+            chars.append(chr(key))
+        return "".join(chars).encode()
+
+    def nodelay(self, flag):
+        self.delay = 0 if flag else -1
+
+    def timeout(self, delay):
+        self.delay = delay
+
+    # Settings that don't mean anything without a terminal
+    def keypad(self, flag):
+        pass
+
+    def scrollok(self, flag):
+        pass
+
+    def idlok(self, flag):
+        pass
+
+    def leaveok(self, flag):
+        pass
+
+    def bkgd(self, *args):
+        pass
+
+class VirtualScreen():
+    """A pretend terminal
+    Windows are copied onto it with noutrefresh, doupdate then makes that what's showing
+    and counts how many cells it had to change like curses would send"""
+    def __init__(self, height=30, width=100, keys=()):
+        self.height = height
+        self.width = width
+        self.keys = deque(key_code(key) for key in keys)
+        self.stdscr = VirtualWindow(self, height, width)
+        # What's been queued by noutrefresh and what's actually on the terminal
+        self.virtual = self.blank()
+        self.physical = self.blank()
+        # Totals since the screen was made, for benchmarks
+        self.updates = 0
+        self.cells_written = 0
+
+    def blank(self):
+        return [[" "] * self.width for _ in range(self.height)]
+
+    def press(self, *keys):
+        """Queue up keys for getch"""
+        self.keys.extend(key_code(key) for key in keys)
+
+    def next_key(self):
+        return self.keys.popleft() if self.keys else -1
+
+    def flushinp(self):
+        self.keys.clear()
+
+    def newwin(self, height, width, y=0, x=0):
+        return VirtualWindow(self, height, width, y, x)
+
+    def copy(self, window):
+        """Copy a window onto the virtual screen where it sits, clipped to the screen"""
+        for row in range(min(window.height, self.height - window.begin_y)):
+            y = window.begin_y + row
+            if y < 0:
+                continue
+            width = max(0, min(window.width, self.width - window.begin_x))
+            self.virtual[y][window.begin_x:window.begin_x + width] = window.cells[row][:width]
+
+    def doupdate(self):
+        """Put the virtual screen on the terminal"""
+        for y in range(self.height):
+            virtual, physical = self.virtual[y], self.physical[y]
+            if virtual != physical:
+                self.cells_written += sum(1 for a, b in zip(virtual, physical) if a != b)
+                self.physical[y] = list(virtual)
+        self.updates += 1
+
+    def resize(self, height, width):
+        """Resize the terminal, stdscr is resized with it like curses does"""
+        self.height = height
+        self.width = width
+        self.stdscr.resize(height, width)
+        self.virtual = self.blank()
+        self.physical = self.blank()
+        self.update_lines_cols()
+        self.press(curses.KEY_RESIZE)
+
+    def update_lines_cols(self):
+        curses.LINES = self.height
+        curses.COLS = self.width
+
+    def snapshot(self):
+        """What's on the terminal as text, trailing spaces stripped"""
+        return "\n".join("".join(row).rstrip() for row in self.physical)
+
+@contextmanager
+def headless(height=30, width=100, keys=()):
+    """Swap curses out for a virtual screen while in the block
+    Yields the VirtualScreen, pass its stdscr to anything that wants one"""
+    screen = VirtualScreen(height, width, keys)
+    nothing = lambda *args: None
+    replacements = {
+        "initscr": lambda: screen.stdscr,
+        "newwin": screen.newwin,
+        "doupdate": screen.doupdate,
+        # Same as curses, the pair number shifted into the attribute bits
+        "color_pair": lambda n: n << 8,
+        "update_lines_cols": screen.update_lines_cols,
+        "flushinp": screen.flushinp,
+    }
+    missing = object()
+    originals = {name: getattr(curses, name, missing) for name in PATCHED + ["LINES", "COLS"]}
+    try:
+        for name in PATCHED:
+            setattr(curses, name, replacements.get(name, nothing))
+        screen.update_lines_cols()
+        yield screen
+    finally:
+        for name, original in originals.items():
+            if original is missing:
+                delattr(curses, name)
+            else:
+                setattr(curses, name, original)